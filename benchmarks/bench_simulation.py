@@ -0,0 +1,228 @@
+"""
+Benchmark of the simulation step throughput and scaling.
+
+Run from the root of the repository:
+    python -m benchmarks.bench_simulation --output results.json
+    python -m benchmarks.bench_simulation --quick --compare results.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+from components import Network, Task
+from power_temp_simulation.ornstein_uhlenbeck import OrnsteinUhlenbeck, MultivariateOrnsteinUhlenbeck
+from power_temp_simulation.power_temp_simulation import PowerSimulator, PowerTemperatureSimulator
+from profiling import SimulationProfiler
+from simulation import Simulation
+from vectorized_components import VectorizedNetwork
+
+# Same structure of the params used in main.py
+PARAMS = {
+    "delta_time": 0.5,
+    "num_boards": 1,
+    "num_cpus": 4,
+    "cpu": {
+        "time_change_status": 10.,
+        "status": 0,
+        "temperature": 45.0,
+        "power": 12.0
+    },
+    "task": {
+        0: {"base_execution_time": 10.0, "std": 0.5, "periodic": True},
+        1: {"base_execution_time": 7.0, "std": 0.2, "periodic": True},
+        2: {"base_execution_time": 5.0, "std": 0.1, "periodic": False},
+        3: {"base_execution_time": 3.0, "std": 0.08, "periodic": False}
+    }
+}
+
+# Task mixes: ids of the tasks assigned round-robin to the cpus (None leaves the cpu idle)
+TASK_MIXES = {
+    "idle": [None],
+    "mixed": [0, 1, 2, 3, None],
+    "periodic": [0, 1]
+}
+
+NETWORKS = {
+    "network": Network,
+    "vectorized": VectorizedNetwork
+}
+
+GRID = {
+    "network": list(NETWORKS),
+    "num_boards": [1, 10, 50],
+    "num_cpus": [4, 16, 64],
+    "delta_time": [0.5, 0.1],
+    "task_mix": list(TASK_MIXES)
+}
+
+QUICK_GRID = {
+    "network": list(NETWORKS),
+    "num_boards": [1, 10],
+    "num_cpus": [4, 16],
+    "delta_time": [0.5],
+    "task_mix": ["mixed"]
+}
+
+
+def _timeit(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def _build(network, num_boards, num_cpus, delta_time, task_mix, seed=0, profiler=None):
+    params = dict(PARAMS, delta_time=delta_time, num_boards=num_boards, num_cpus=num_cpus)
+    task_params = params.get("task")
+    tasks = [Task(idx, base_execution_time=task_params.get(idx)['base_execution_time'],
+                  std=task_params.get(idx)['std'], is_periodic=task_params.get(idx)['periodic'])
+             for idx in task_params.keys()]
+    net = NETWORKS[network](num_boards=num_boards, num_cpus=num_cpus, _random=None, _params=params, seed=seed)
+    sim = Simulation(_object=net, delta_time=delta_time, profiler=profiler)
+
+    mix = [tasks[task_id] if task_id is not None else None for task_id in TASK_MIXES[task_mix]]
+    data = {board_id: [mix[(board_id * num_cpus + cpu_id) % len(mix)] for cpu_id in range(num_cpus)]
+            for board_id in range(num_boards)}
+    return sim, data
+
+
+def _profile_stats(profiler):
+    # JSON keys must be strings: the board ids (None for the phases not split per board) are converted
+    return {phase: dict(phase_stats, boards={str(board_id): board_stats
+                                             for board_id, board_stats in phase_stats['boards'].items()})
+            for phase, phase_stats in profiler.stats().items()}
+
+
+def bench_step(network, num_boards, num_cpus, delta_time, task_mix, sim_seconds):
+    """
+    Throughput of Simulation.running_simulation for one configuration, with the time of every phase
+    (status, power_temperature, task) measured on a separate profiled run of the same length
+    """
+    result = {"network": network, "num_boards": num_boards, "num_cpus": num_cpus, "delta_time": delta_time,
+              "task_mix": task_mix, "sim_seconds": sim_seconds}
+
+    start = time.perf_counter()
+    sim, data = _build(network, num_boards, num_cpus, delta_time, task_mix)
+    result["build_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sim.interact_with_object(data, is_assign_task=True)
+    result["assign_s"] = time.perf_counter() - start
+
+    steps = int(max(delta_time, sim_seconds) // delta_time)
+    start = time.perf_counter()
+    sim.running_simulation(time_interval=sim_seconds)
+    elapsed = time.perf_counter() - start
+    result["run_s"] = elapsed
+    result["steps_per_s"] = steps / elapsed
+    result["cpu_steps_per_s"] = steps * num_boards * num_cpus / elapsed
+
+    start = time.perf_counter()
+    sim.interact_with_object(is_get_data=True)
+    result["get_data_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sim.interact_with_object(is_get_snapshot=True)
+    result["snapshot_s"] = time.perf_counter() - start
+
+    # TIME OF EVERY PHASE, on a separate run since the instrumented code path is slower
+    profiler = SimulationProfiler()
+    sim, data = _build(network, num_boards, num_cpus, delta_time, task_mix, profiler=profiler)
+    sim.interact_with_object(data, is_assign_task=True)
+    profiler.reset()
+    sim.running_simulation(time_interval=sim_seconds)
+    result["phases"] = _profile_stats(profiler)
+
+    # PEAK MEMORY, measured on a separate (shorter) run since tracing slows down the simulation
+    tracemalloc.start()
+    sim, data = _build(network, num_boards, num_cpus, delta_time, task_mix)
+    sim.interact_with_object(data, is_assign_task=True)
+    sim.running_simulation(time_interval=delta_time * min(steps, 10))
+    result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result
+
+
+def bench_micro(repeat):
+    """
+    Microbenchmarks of the OU generators and of the interact read/write paths
+    """
+    results = dict()
+    random = np.random.RandomState(0)
+
+    power_sim = PowerSimulator(random=random)
+    generator = OrnsteinUhlenbeck(power_sim.levels[0], random=random)
+    results["ou_value_at_s"] = _timeit(lambda: generator.value_at(1), repeat)
+
+    power_temp_sim = PowerTemperatureSimulator(random=random)
+    generator = MultivariateOrnsteinUhlenbeck(power_temp_sim.levels[0], random=random)
+    results["multivariate_ou_value_at_s"] = _timeit(lambda: generator.value_at(1), repeat)
+
+    for network in NETWORKS:
+        sim, data = _build(network, 10, 16, 0.5, "mixed")
+        results[f"{network}_interact_write_s"] = _timeit(
+            lambda: sim.interact_with_object(data, is_assign_task=True), max(1, repeat // 100))
+        results[f"{network}_interact_read_s"] = _timeit(
+            lambda: sim.interact_with_object(is_get_data=True), max(1, repeat // 100))
+        results[f"{network}_snapshot_s"] = _timeit(
+            lambda: sim.interact_with_object(is_get_snapshot=True), max(1, repeat // 100))
+
+    return results
+
+
+def run(grid, sim_seconds, repeat):
+    keys = list(grid)
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "micro": bench_micro(repeat),
+        "step": [bench_step(**dict(zip(keys, values)), sim_seconds=sim_seconds)
+                 for values in itertools.product(*(grid[key] for key in keys))]
+    }
+
+
+def compare(results, baseline):
+    """
+    Print the speed-up of every benchmark with respect to a previous run (> 1 means faster)
+    """
+    for name, value in results["micro"].items():
+        if name in baseline["micro"]:
+            print(f"{name:40} {baseline['micro'][name] / value:8.2f}x")
+
+    def config(result):
+        return tuple(result[key] for key in GRID)
+
+    baseline_steps = {config(result): result for result in baseline["step"]}
+    for result in results["step"]:
+        previous = baseline_steps.get(config(result))
+        if previous is not None:
+            print(f"{str(config(result)):40} {result['cpu_steps_per_s'] / previous['cpu_steps_per_s']:8.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of the simulation step throughput and scaling")
+    parser.add_argument("--quick", action="store_true", help="run a reduced grid")
+    parser.add_argument("--sim-seconds", type=float, default=20.0, help="virtual seconds simulated per configuration")
+    parser.add_argument("--repeat", type=int, default=10000, help="repetitions of the microbenchmarks")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--compare", help="json file of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = run(QUICK_GRID if args.quick else GRID, args.sim_seconds, args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(results, json.load(baseline_file))
@@ -1,14 +1,261 @@
-import random
-from power_temp_simulation.power_temp_simulation import PowerTemperatureSimulator
-
-SIM_TIME = 0.0
-DELTA_TIME = 0.0
+import bisect
+import math
+import time
+
+import numpy as np
+
+from hotspot import HotspotIndex
+from power_temp_simulation.ornstein_uhlenbeck import keyed_normals, stationary_std, transition_coefficients
+from power_temp_simulation.power_temp_simulation import POWER_TEMPERATURE_LEVELS, build_levels
+
+
+# Typed fields of the structured array returned by the snapshot of a network, one element per cpu
+SNAPSHOT_DTYPE = np.dtype([
+    ('task_id', np.int64),
+    ('temperature', np.float64),
+    ('power', np.float64),
+    ('status', np.int64)
+])
+
+# A stable idle cpu is parked only once its power/temperature are within this number of stationary standard
+# deviations of the mean of its level, so the values of a parked cpu fluctuate around a fixed mean
+PARK_DEVIATION = 1.0
+
+# Steps of the keyed normals drawn in one block by advance_keyed
+KEYED_BLOCK_STEPS = 64
+# Up to this number of cpus advance_keyed steps them in python floats, the same operations of the NumPy path
+KEYED_SCALAR_CPUS = 8
+
+
+def _seed_sequence(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def selected_cpus(mask, shape):
+    """
+    Flat indexes of the cpus selected by a (boards x cpus) boolean mask, every cpu if the mask is None
+    """
+    if mask is None:
+        return np.arange(int(np.prod(shape)))
+    return np.flatnonzero(mask)
+
+
+def check_statuses(statuses, levels):
+    """
+    Raise a ValueError, as CPU.set_status, if any status is not the index of a level of the table
+    """
+    statuses = np.asarray(statuses)
+    unknown = statuses[(statuses < 0) | (statuses >= len(levels))]
+    if unknown.size:
+        raise ValueError(f"Unknown level: {unknown.flat[0]}")
+
+
+def reseed_tasks(tasks, seed):
+    """
+    Give every distinct task of the sequence its own stream spawned from the seed (int or SeedSequence)
+    """
+    tasks = list({id(task): task for task in tasks if isinstance(task, Task)}.values())
+    for task, _random in zip(tasks, spawn_generators(seed, len(tasks))):
+        task.reseed(_random)
+
+
+def spawn_generators(seed, num):
+    """
+    Independent numpy generators spawned from a seed (int or SeedSequence), e.g. one per task
+    """
+    return [np.random.default_rng(child) for child in _seed_sequence(seed).spawn(num)]
+
+
+def derived_sequence(_random):
+    """
+    SeedSequence seeded with one draw of a random stream (RandomState or Generator), to spawn streams from it
+    """
+    return np.random.SeedSequence(int.from_bytes(_random.bytes(16), 'little'))
+
+
+def derive_noise_key(source):
+    """
+    Integer key of the normals of the parked cpus (see keyed_normals)
+    :param source: seed (int or SeedSequence), or random stream (RandomState or Generator) to draw the key from
+    """
+    if isinstance(source, (int, np.integer, np.random.SeedSequence)):
+        return int(_seed_sequence(source).generate_state(1, np.uint64)[0])
+    return int.from_bytes(source.bytes(8), 'little')
+
+
+def advance_keyed(noise_key, index, start, steps, coefficients, power, temperature):
+    """
+    Advance power/temperature values one step at a time, with the normals keyed by (noise key, cpu index, step).
+    Every step applies the same elementwise float operations to every cpu, so the values reached at a step do
+    not depend on how many times, and together with which cpus, they were advanced before: reading a parked
+    cpu does not change its trajectory.
+    :param noise_key: integer key (or one per cpu), see derive_noise_key
+    :param index: flat indexes of the cpus
+    :param start: clock step of the current values, per cpu
+    :param steps: number of steps to advance, per cpu
+    :param coefficients: (cpus x 9) array, transition of one step of the level of every cpu (see
+                         transition_coefficients)
+    :param power: current power, per cpu
+    :param temperature: current temperature, per cpu
+    :return: (power, temperature) arrays after the steps
+    """
+    # Cpus sorted by decreasing number of steps: the ones still advancing at a step are a prefix
+    order = np.argsort(-np.asarray(steps), kind='stable')
+    index = np.asarray(index)[order]
+    noise_key = np.broadcast_to(np.asarray(noise_key, dtype=np.uint64), index.shape)[order]
+    start = np.asarray(start)[order]
+    steps = np.asarray(steps)[order]
+    coefficients = np.asarray(coefficients, dtype=float)[order]
+    mu_power, mu_temperature, a00, a01, a10, a11, l00, l10, l11 = np.ascontiguousarray(coefficients.T)
+    power = np.array(power, dtype=float)[order]
+    temperature = np.array(temperature, dtype=float)[order]
+
+    total = int(steps[0]) if steps.size else 0
+    for block_start in range(0, total, KEYED_BLOCK_STEPS):
+        block = min(KEYED_BLOCK_STEPS, total - block_start)
+        size = int(np.count_nonzero(steps > block_start))
+        # (steps x cpus) normals of the block
+        z0, z1 = keyed_normals(noise_key[:size], index[:size],
+                               start[:size] + np.arange(block_start, block_start + block)[:, None])
+        if size <= KEYED_SCALAR_CPUS:
+            for cpu_idx in range(size):
+                cpu_power, cpu_temperature = float(power[cpu_idx]), float(temperature[cpu_idx])
+                cpu_mu_power, cpu_mu_temperature, c00, c01, c10, c11, m00, m10, m11 = coefficients[cpu_idx].tolist()
+                cpu_steps = min(block, int(steps[cpu_idx]) - block_start)
+                for n0, n1 in zip(z0[:cpu_steps, cpu_idx].tolist(), z1[:cpu_steps, cpu_idx].tolist()):
+                    dp = cpu_power - cpu_mu_power
+                    dt = cpu_temperature - cpu_mu_temperature
+                    cpu_power = cpu_mu_power + c00 * dp + c01 * dt + m00 * n0
+                    cpu_temperature = cpu_mu_temperature + c10 * dp + c11 * dt + m10 * n0 + m11 * n1
+                power[cpu_idx] = cpu_power
+                temperature[cpu_idx] = cpu_temperature
+            continue
+        for offset in range(block):
+            size = int(np.count_nonzero(steps[:size] > block_start + offset))
+            dp = power[:size] - mu_power[:size]
+            dt = temperature[:size] - mu_temperature[:size]
+            power[:size] = mu_power[:size] + a00[:size] * dp + a01[:size] * dt + l00[:size] * z0[offset, :size]
+            temperature[:size] = (mu_temperature[:size] + a10[:size] * dp + a11[:size] * dt +
+                                  l10[:size] * z0[offset, :size] + l11[:size] * z1[offset, :size])
+
+    unsorted_power = np.empty_like(power)
+    unsorted_temperature = np.empty_like(temperature)
+    unsorted_power[order] = power
+    unsorted_temperature[order] = temperature
+    return unsorted_power, unsorted_temperature
+
+
+def catch_up_cpus(cpus):
+    """
+    Advance the power/temperature of the parked cpus to the current step of their clock, batched
+    (see advance_keyed)
+    :param cpus: iterable of cpus, the awake ones and the ones already caught up are skipped
+    """
+    behind = [cpu for cpu in cpus if cpu.parked_step is not None and cpu.parked_step < cpu.clock.step]
+    if not behind:
+        return
+    start = np.array([cpu.parked_step for cpu in behind], dtype=np.int64)
+    # Transition looked up once per level
+    coefficients = dict()
+    for cpu in behind:
+        ou_params = cpu.levels[cpu.status]
+        if (id(ou_params), cpu.clock.delta_time) not in coefficients:
+            coefficients[id(ou_params), cpu.clock.delta_time] = transition_coefficients(ou_params,
+                                                                                        cpu.clock.delta_time)
+    power, temperature = advance_keyed(
+        np.array([cpu.noise_key for cpu in behind], dtype=np.uint64),
+        np.array([cpu.index if cpu.index is not None else cpu.id for cpu in behind], dtype=np.int64),
+        start,
+        np.array([cpu.clock.step for cpu in behind], dtype=np.int64) - start,
+        [coefficients[id(cpu.levels[cpu.status]), cpu.clock.delta_time] for cpu in behind],
+        [cpu._power for cpu in behind],
+        [cpu._temperature for cpu in behind])
+    for cpu, cpu_power, cpu_temperature in zip(behind, power.tolist(), temperature.tolist()):
+        cpu._power = cpu_power
+        cpu._temperature = cpu_temperature
+        cpu.parked_step = cpu.clock.step
+
+
+class Clock:
+    """
+    Time of a simulation, owned by the Simulation instance and shared by every component of its network
+    """
+    __slots__ = ('sim_time', 'delta_time', 'step', 'version', 'changes', 'changes_start')
+
+    # Number of last versions kept in the change log
+    CHANGE_LOG_VERSIONS = 64
+
+    def __init__(self, delta_time=1.0, sim_time=0.0):
+        self.sim_time = sim_time        # Global time of the simulation
+        self.delta_time = delta_time    # Time interval between steps in the simulation
+        self.step = 0                   # Number of steps simulated, used to catch up the parked cpus
+        self.version = 0                # Stamp of the discrete changes of the cpus, increased by SnapshotCursor.poll
+        # CHANGE LOG: flat indexes of the cpus whose task or status changed, per version, from changes_start on
+        self.changes = dict()
+        self.changes_start = 0
+
+    def mark_changed(self, idx):
+        """
+        Log a change of task or status of the cpus at the current version
+        :param idx: iterable of flat indexes of the cpus in the network
+        """
+        self.changes.setdefault(self.version, set()).update(idx)
+
+    def changes_since(self, version):
+        """
+        :return: flat indexes of the cpus changed at the given version or later, None if the log no longer
+                 covers the version
+        """
+        if version < self.changes_start:
+            return None
+        changed = set()
+        for changes_version, idx in self.changes.items():
+            if changes_version >= version:
+                changed.update(idx)
+        return np.fromiter(changed, dtype=np.int64, count=len(changed))
+
+    def new_version(self):
+        """
+        Stamp the changes from now on with a newer version, the oldest versions are dropped from the log
+        """
+        self.version += 1
+        self.changes_start = max(self.changes_start, self.version - self.CHANGE_LOG_VERSIONS)
+        for changes_version in [changes_version for changes_version in self.changes
+                                if changes_version < self.changes_start]:
+            del self.changes[changes_version]
+
+
+def get_levels(cpu_params):
+    """
+    Power/temperature levels of the cpus: the 'levels' entry of the cpu params (list of dictionaries with
+    mu, sigma, theta, delta) or the default shared table
+    """
+    if cpu_params is not None and cpu_params.get('levels') is not None:
+        return build_levels(cpu_params.get('levels'))
+    return POWER_TEMPERATURE_LEVELS
 
 
 class CPU:
-    def __init__(self, _id, _random, _params=None):
+    # Compact objects: no per-instance dictionary, faster attribute access in the update loop.
+    # The power/temperature are the value of a 2-variate OU process following the level of the status: the cpu
+    # keeps only the two floats, the levels table and the transition coefficients are shared by every cpu
+    __slots__ = ('id', 'index', 'clock', 'random', 'levels', 'coefficients', 'default_params',
+                 'delta_time_change_status', 'status', 'working_time', 'is_busy', 'current_task', 'task_time',
+                 '_temperature', '_power', 'changed_version', 'parked_step', 'noise_key')
+
+    def __init__(self, _id, _random, _params=None, clock=None, levels=None, index=None, noise_key=0):
         self.id = _id
-        self.power_temp_sim = PowerTemperatureSimulator(random=_random)
+        # Flat index of the cpu in its network, used by the change log of the clock
+        self.index = index
+        self.clock = clock if clock is not None else Clock()
+        # Random stream of the cpu (status changes and power/temperature simulation), shared by the cpus of a board
+        self.random = _random
+        # The levels table is shared by every cpu, see get_levels
+        self.levels = levels if levels is not None else POWER_TEMPERATURE_LEVELS
+        # Transition of one step at the level of the status (see transition_coefficients), None to look it up
+        self.coefficients = None
         self.default_params = _params
 
         # GENERIC PARAMETERS
@@ -23,12 +270,19 @@ class CPU:
         self.current_task = None
         self.task_time = 0.0
 
-        # POWER TEMPERATURE SPECIFIC PARAMETERS
-        self.temperature = 0
-        self.power = 0
+        # POWER TEMPERATURE SPECIFIC PARAMETERS (see the temperature and power properties)
+        self._temperature = 0
+        self._power = 0
+
+        # Clock version of the last change of task or status, see SnapshotCursor
+        self.changed_version = self.clock.version
+
+        # Clock step up to which the power/temperature of a parked cpu are simulated (None if the cpu is awake)
+        self.parked_step = None
+        # Key of the normals of the steps simulated while parked, shared by the cpus of a network (see advance_keyed)
+        self.noise_key = noise_key
 
         self.reset()
-        self.power_temp_sim.set_level(self.status)
 
     def reset(self):
         # GENERIC PARAMETERS
@@ -36,6 +290,7 @@ class CPU:
 
         # CPU SPECIFIC PARAMETERS
         self.status = self.default_params.get('status')
+        self.coefficients = None
         self.working_time = 0.0
 
         # TASK SPECIFIC PARAMETERS
@@ -44,10 +299,32 @@ class CPU:
         self.task_time = 0.0
 
         # POWER TEMPERATURE SPECIFIC PARAMETERS
-        self.temperature = self.default_params.get('temperature')
-        self.power = self.default_params.get('power')
+        self._temperature = self.default_params.get('temperature')
+        self._power = self.default_params.get('power')
+        self.mark_changed()
+
+    @property
+    def temperature(self):
+        # A parked cpu is caught up first
+        if self.parked_step is not None and self.parked_step < self.clock.step:
+            catch_up_cpus((self,))
+        return self._temperature
+
+    @property
+    def power(self):
+        if self.parked_step is not None and self.parked_step < self.clock.step:
+            catch_up_cpus((self,))
+        return self._power
+
+    def mark_changed(self):
+        # Stamp a change of task or status, see SnapshotCursor
+        self.changed_version = self.clock.version
+        if self.index is not None:
+            self.clock.mark_changed((self.index,))
 
     def assign_task(self, task):
+        if (task.id if task is not None else -1) != (self.current_task.id if self.current_task is not None else -1):
+            self.mark_changed()
         self.current_task = task
         # if the task is the null task put the cpu in idle
         if self.current_task is None:
@@ -58,14 +335,41 @@ class CPU:
         self.execute_task()
 
     def execute_task(self):
-        self.task_time = self.current_task.execute() + SIM_TIME
+        self.task_time = self.current_task.execute() + self.clock.sim_time
+
+    def reseed(self, _random):
+        """
+        Use a new random stream for status changes and power/temperature
+        """
+        self.random = _random
 
     def set_status(self, val):
+        if not 0 <= val < len(self.levels):
+            raise ValueError(f"Unknown level: {val}")
+        if val != self.status:
+            self.mark_changed()
+            self.coefficients = None
         self.status = val
-        self.power_temp_sim.set_level(self.status)
 
     def simulate_params(self):
-        self.power, self.temperature = self.power_temp_sim.value_at(1)
+        # The process is advanced by the simulated time of the step (exact for any delta_time)
+        coefficients = self.coefficients
+        if coefficients is None:
+            coefficients = self.coefficients = transition_coefficients(self.levels[self.status],
+                                                                       self.clock.delta_time)
+        self.advance_params(coefficients)
+
+    def advance_params(self, coefficients):
+        """
+        Exact transition of the power/temperature, in python floats
+        :param coefficients: mu, A and L of the transition, see transition_coefficients
+        """
+        mu_power, mu_temperature, a00, a01, a10, a11, l00, l10, l11 = coefficients
+        z0, z1 = self.random.standard_normal(2).tolist()
+        power = self._power - mu_power
+        temperature = self._temperature - mu_temperature
+        self._power = mu_power + a00 * power + a01 * temperature + l00 * z0
+        self._temperature = mu_temperature + a10 * power + a11 * temperature + l10 * z0 + l11 * z1
 
     def prob_to_change_status(self):
         # Dividing the working_time in chunks, each one correspond to the status time interval
@@ -79,7 +383,7 @@ class CPU:
             if int_value < self.status:
                 prob = 1 - prob
 
-            if random.random() < prob:
+            if self.random.random() < prob:
                 self.set_status(int_value)
 
     def update(self):
@@ -90,11 +394,31 @@ class CPU:
         # Simulate temperature and power consumption
         self.simulate_params()
 
+        # Task bookkeeping
+        self.update_task()
+
+    def update_profiled(self, profiler, board_id):
+        """
+        Same as update(), the time spent in every phase is accumulated in the profiler
+        """
+        start = time.perf_counter()
+        self.prob_to_change_status()
+        status_end = time.perf_counter()
+        self.simulate_params()
+        params_end = time.perf_counter()
+        self.update_task()
+        task_end = time.perf_counter()
+
+        profiler.add('status', board_id, status_end - start)
+        profiler.add('power_temperature', board_id, params_end - status_end)
+        profiler.add('task', board_id, task_end - params_end)
+
+    def update_task(self):
         # CPU IS WORKING
         if self.current_task is not None:
             # TASK isn't ended yet
-            if SIM_TIME < self.task_time:
-                self.working_time += DELTA_TIME
+            if self.clock.sim_time < self.task_time:
+                self.working_time += self.clock.delta_time
                 return
 
             # If the task is a periodic one the cpu will auto re-assign the same task
@@ -109,12 +433,90 @@ class CPU:
                 self.task_time = 0.0
                 # CLEAR TASK
                 self.current_task = None
+                self.mark_changed()
                 return
 
         # REDUCE WORKING TIME SINCE
-        self.working_time -= DELTA_TIME
+        self.working_time -= self.clock.delta_time
         self.working_time = max(0.0, self.working_time)
 
+    def is_stable_idle(self):
+        """
+        True if update() can only change the power/temperature of the cpu: no task, no working time
+        to recover and the status of an idle cpu
+        """
+        return self.current_task is None and self.working_time == 0.0 and self.status == 0
+
+    def is_settled(self):
+        """
+        True if the power/temperature are within PARK_DEVIATION stationary standard deviations of the mean of
+        the level, i.e. they are no longer relaxing towards it
+        """
+        ou_params = self.levels[self.status]
+        std_power, std_temperature = stationary_std(ou_params)
+        mu_power, mu_temperature = ou_params.mu.tolist()
+        return (abs(self._power - mu_power) <= PARK_DEVIATION * std_power and
+                abs(self._temperature - mu_temperature) <= PARK_DEVIATION * std_temperature)
+
+    def park(self):
+        """
+        Stop updating a stable idle cpu at the end of the current step: its power/temperature are advanced
+        lazily, with keyed normals, when they are read or the cpu is changed (see catch_up_cpus)
+        """
+        self.parked_step = self.clock.step + 1
+
+    def catch_up(self):
+        """
+        Advance the power/temperature of a parked cpu to the current step of the clock
+        """
+        catch_up_cpus((self,))
+
+    def wake(self):
+        """
+        Catch up a parked cpu and update it again at every step
+        """
+        self.catch_up()
+        self.parked_step = None
+
+    def steps_to_next_event(self):
+        """
+        Number of next steps (lower bound) in which update() would not change the task or the status of the cpu:
+        in those steps only the working time and the power/temperature evolve, see advance_quiet()
+        """
+        if self.parked_step is not None:
+            return math.inf
+
+        status_value = min(3, int(self.working_time / self.delta_time_change_status))
+        if status_value != self.status:
+            return 0
+
+        # CPU IS WORKING: the working time grows until the task ends or the next status interval is reached
+        if self.current_task is not None:
+            steps = max(0, math.ceil((self.task_time - self.clock.sim_time) / self.clock.delta_time) - 1)
+            if self.status < 3:
+                next_change = (self.status + 1) * self.delta_time_change_status
+                steps = min(steps, max(0, math.ceil((next_change - self.working_time) / self.clock.delta_time) - 1))
+            return steps
+
+        # CPU IS IDLE: the working time decreases until the previous status interval is reached
+        if self.status == 0:
+            return math.inf
+        previous_change = self.status * self.delta_time_change_status
+        return max(0, math.floor((self.working_time - previous_change) / self.clock.delta_time))
+
+    def advance_quiet(self, steps):
+        """
+        Apply in bulk a number of steps in which nothing discrete happens (see steps_to_next_event())
+        """
+        # Parked cpus are caught up from the clock step when read
+        if steps <= 0 or self.parked_step is not None:
+            return
+        self.advance_params(transition_coefficients(self.levels[self.status], steps * self.clock.delta_time))
+        if self.current_task is not None:
+            self.working_time += steps * self.clock.delta_time
+        else:
+            self.working_time = max(0.0, self.working_time - steps * self.clock.delta_time)
+
     def get_param_info(self) -> str:
         task_value = [self.current_task.id if self.current_task is not None else -1]
         return ("JID:[" + f"{task_value[0]}".rjust(2) + "] " +
@@ -130,40 +532,144 @@ class CPU:
 
 
 class Task:
-    def __init__(self, _id, base_execution_time=0.0, std=0.0, is_periodic=False):
+    __slots__ = ('id', 'base_execution_time', 'std', 'is_periodic', 'random', 'block_size', 'buffer', 'buffer_index')
+
+    def __init__(self, _id, base_execution_time=0.0, std=0.0, is_periodic=False, _random=None, block_size=1024):
         self.id = _id
         self.base_execution_time = base_execution_time
         self.std = std
         self.is_periodic = is_periodic
+        # Random stream of the task (numpy generator)
+        self.random = _random if _random is not None else np.random.default_rng()
+
+        # Execution times are drawn in blocks and handed out from the buffer
+        self.block_size = block_size
+        self.buffer = np.empty(0)
+        self.buffer_index = 0
+
+    def reseed(self, _random):
+        """
+        Use a new random stream, the execution times already drawn are discarded
+        """
+        self.random = _random
+        self.buffer = np.empty(0)
+        self.buffer_index = 0
+
+    def _refill(self):
+        self.buffer = self.base_execution_time + np.abs(self.random.normal(self.base_execution_time, self.std,
+                                                                           size=self.block_size))
+        self.buffer_index = 0
 
     def execute(self):
-        execution_time = self.base_execution_time + abs(random.gauss(self.base_execution_time, self.std))
+        if self.buffer_index == self.buffer.shape[0]:
+            self._refill()
+        execution_time = float(self.buffer[self.buffer_index])
+        self.buffer_index += 1
         # print(f"Task {self.id} is being executed for {execution_time:.3f} seconds.")
         return execution_time
 
+    def execute_many(self, num):
+        """
+        Execution times of num executions of the task, taken from the buffer in one go
+        """
+        execution_times = np.empty(num)
+        filled = 0
+        while filled < num:
+            if self.buffer_index == self.buffer.shape[0]:
+                self._refill()
+            size = min(num - filled, self.buffer.shape[0] - self.buffer_index)
+            execution_times[filled:filled + size] = self.buffer[self.buffer_index:self.buffer_index + size]
+            self.buffer_index += size
+            filled += size
+        return execution_times
+
 
 class Board:
-    def __init__(self, _id, num_cpus, _random, _params=None):
+    __slots__ = ('id', 'cpus', 'awake')
+
+    def __init__(self, _id, num_cpus, _random, _params=None, clock=None, seed_sequence=None, levels=None,
+                 noise_key=None):
         self.id = _id
         cpu_params = None
         if _params is not None:
             cpu_params = _params.get('cpu')
-        self.cpus = [CPU(i, _random, cpu_params) for i in range(num_cpus)]
+        if levels is None:
+            levels = get_levels(cpu_params)
+        # With a seed sequence the board gets its own stream spawned from it, shared by its cpus, otherwise
+        # every cpu uses _random
+        if seed_sequence is not None:
+            _random = np.random.default_rng(seed_sequence)
+        # Key of the normals of the parked cpus, shared by the boards of a network
+        if noise_key is None:
+            noise_key = derive_noise_key(_random)
+        self.cpus = [CPU(i, _random, cpu_params, clock, levels, _id * num_cpus + i, noise_key)
+                     for i in range(num_cpus)]
+        # Indexes (sorted) of the cpus updated at every step, the others are parked
+        self.awake = list(range(num_cpus))
+
+    def set_clock(self, clock):
+        self.catch_up()
+        for cpu in self.cpus:
+            cpu.clock = clock
+            cpu.coefficients = None
+            if cpu.parked_step is not None:
+                cpu.parked_step = clock.step
+
+    def reseed(self, seed_sequence, noise_key):
+        # The parked cpus are caught up with the previous key first
+        self.catch_up()
+        _random = np.random.default_rng(seed_sequence)
+        for cpu in self.cpus:
+            cpu.reseed(_random)
+            cpu.noise_key = noise_key
+
+    def wake(self, idx):
+        cpu = self.cpus[idx]
+        if cpu.parked_step is not None:
+            cpu.wake()
+            bisect.insort(self.awake, idx)
+
+    def catch_up(self):
+        catch_up_cpus(self.cpus)
 
     def assign_data(self, data, is_fault=False):
-        for idx, _d in enumerate(data):
+        if is_fault:
+            changes = [(idx, _d) for idx, _d in enumerate(data) if _d != -1]
+        else:
+            changes = [(idx, _d) for idx, _d in enumerate(data) if isinstance(_d, Task) or _d == None]
+        if is_fault and self.cpus:
+            # Statuses checked before any change
+            check_statuses([_d for _, _d in changes], self.cpus[0].levels)
+        # The parked cpus to change are caught up in one batch
+        catch_up_cpus(self.cpus[idx] for idx, _ in changes)
+        for idx, _d in changes:
+            self.wake(idx)
             if is_fault:
-                if _d != -1:
-                    self.cpus[idx].set_status(_d)
+                self.cpus[idx].set_status(_d)
             else:
-                if isinstance(_d, Task) or _d == None:
-                    self.cpus[idx].assign_task(_d)
+                self.cpus[idx].assign_task(_d)
+
+    def _park_stable(self):
+        # Stable idle cpus are parked, once settled around the mean of their level, until they are assigned a task
+        # or faulted
+        parked = [idx for idx in self.awake if self.cpus[idx].is_stable_idle() and self.cpus[idx].is_settled()]
+        if parked:
+            for idx in parked:
+                self.cpus[idx].park()
+            self.awake = [idx for idx in self.awake if self.cpus[idx].parked_step is None]
 
     def update(self):
-        for cpu in self.cpus:
-            cpu.update()
+        for idx in self.awake:
+            self.cpus[idx].update()
+        self._park_stable()
+
+    def update_profiled(self, profiler):
+        for idx in self.awake:
+            self.cpus[idx].update_profiled(profiler, self.id)
+        self._park_stable()
 
     def collect_data_from_cpus(self):
+        self.catch_up()
         output_list = list()
         for cpu in self.cpus:
             if cpu.current_task is not None:
@@ -175,7 +681,26 @@ class Board:
             output_list.append(cpu.status)
         return output_list
 
+    def write_state(self, task_id, temperature, power, status):
+        """
+        Write the numeric state of the cpus in the given rows (one element per cpu), without building lists
+        """
+        self.catch_up()
+        for idx, cpu in enumerate(self.cpus):
+            task_id[idx] = cpu.current_task.id if cpu.current_task is not None else -1
+            temperature[idx] = cpu.temperature
+            power[idx] = cpu.power
+            status[idx] = cpu.status
+
+    def write_change_versions(self, changed_version):
+        """
+        Write the clock version of the last change of task or status of the cpus in the given row
+        """
+        for idx, cpu in enumerate(self.cpus):
+            changed_version[idx] = cpu.changed_version
+
     def self_report(self):
+        self.catch_up()
         string_output = f"Board[{self.id:03}]"
         for cpu in self.cpus:
             string_output += f"\t|"
@@ -184,24 +709,194 @@ class Board:
         return string_output
 
     def reset(self):
+        for idx in range(len(self.cpus)):
+            self.wake(idx)
         for cpu in self.cpus:
             cpu.reset()
 
 
 class Network:
-    def __init__(self, num_boards, num_cpus, _random, _params=None):
-        self.boards = [Board(idx, num_cpus, _random, _params) for idx in range(num_boards)]
+    def __init__(self, num_boards, num_cpus, _random, _params=None, clock=None, seed=None):
+        if _random is None and seed is None:
+            raise ValueError('The network needs a random stream (_random) or a seed')
+        self.clock = clock if clock is not None else Clock()
+        # With a seed (int or SeedSequence) every board gets its own stream spawned from it.
+        # The tasks get streams spawned from the task sequence when they are assigned (see _seed_tasks)
+        board_sequences = [None] * num_boards
+        if seed is not None:
+            *board_sequences, noise_sequence, self.task_sequence = _seed_sequence(seed).spawn(num_boards + 2)
+            self.noise_key = derive_noise_key(noise_sequence)
+        else:
+            self.noise_key = derive_noise_key(_random)
+            self.task_sequence = derived_sequence(_random)
+        # Levels table built once and shared by every cpu of the network
+        self.levels = get_levels(_params.get('cpu') if _params is not None else None)
+        self.boards = [Board(idx, num_cpus, _random, _params, self.clock, board_sequences[idx], self.levels,
+                             self.noise_key) for idx in range(num_boards)]
+        # Optional HotspotIndex, see enable_hotspot_index
+        self.hotspot_index = None
+
+    def set_clock(self, clock):
+        self.clock = clock
+        for board in self.boards:
+            board.set_clock(clock)
+
+    def reseed(self, seed):
+        """
+        New random streams spawned from the seed (int or SeedSequence) for every board and for the tasks assigned
+        to them, e.g. to make the branches of a forked simulation independent
+        """
+        cpu_sequence, self.task_sequence, noise_sequence = _seed_sequence(seed).spawn(3)
+        self.noise_key = derive_noise_key(noise_sequence)
+        for board, board_sequence in zip(self.boards, cpu_sequence.spawn(len(self.boards))):
+            board.reseed(board_sequence, self.noise_key)
+        reseed_tasks([cpu.current_task for board in self.boards for cpu in board.cpus], self.task_sequence)
+
+    def _seed_tasks(self, tasks):
+        # The tasks assigned get new streams spawned from the task sequence of the network, so that a seeded run
+        # does not depend on the streams the tasks were created with
+        reseed_tasks(tasks, self.task_sequence.spawn(1)[0])
 
     def update(self):
+        # Cpus stepped, the only ones read by the hotspot index
+        stepped = self.awake_cpus() if self.hotspot_index is not None else None
         for board in self.boards:
             board.update()
+        self._refresh_hotspot_index(stepped)
+
+    def update_profiled(self, profiler):
+        stepped = self.awake_cpus() if self.hotspot_index is not None else None
+        for board in self.boards:
+            board.update_profiled(profiler)
+        self._refresh_hotspot_index(stepped)
+
+    def enable_hotspot_index(self, top_k=50, max_staleness=10):
+        """
+        Maintain a HotspotIndex (top-k hottest cpus, per board power and maximum temperature), refreshed
+        after every update
+        :param max_staleness: number of updates within which every parked cpu is caught up and read by the index
+        :return: the index
+        """
+        self.hotspot_index = HotspotIndex(len(self.boards), len(self.boards[0].cpus) if self.boards else 0, top_k,
+                                          max_staleness)
+        self.hotspot_index.refresh(self)
+        return self.hotspot_index
+
+    def _refresh_hotspot_index(self, idx=None):
+        # idx: flat indexes of the cpus changed, every cpu if None
+        if self.hotspot_index is not None:
+            self.hotspot_index.refresh(self, idx)
 
     def reset(self):
         for board in self.boards:
             board.reset()
+        self._refresh_hotspot_index()
+
+    def catch_up(self):
+        """
+        Advance the power/temperature of every parked cpu of the network to the current step of the clock,
+        batched over the boards
+        """
+        catch_up_cpus(cpu for board in self.boards for cpu in board.cpus)
+
+    def write_state(self, task_id, temperature, power, status):
+        """
+        Write the numeric state of the network in the given (boards x cpus) arrays
+        """
+        self.catch_up()
+        for idx, board in enumerate(self.boards):
+            board.write_state(task_id[idx], temperature[idx], power[idx], status[idx])
+
+    def snapshot(self, out=None):
+        """
+        Numeric state of the network, no string is formatted
+        :param out: optional (boards x cpus) array with SNAPSHOT_DTYPE to reuse
+        :return: (boards x cpus) structured array with SNAPSHOT_DTYPE
+        """
+        if out is None:
+            out = np.empty((len(self.boards), len(self.boards[0].cpus) if self.boards else 0), dtype=SNAPSHOT_DTYPE)
+        self.write_state(out['task_id'], out['temperature'], out['power'], out['status'])
+        return out
+
+    def change_versions(self, out=None):
+        """
+        Clock version of the last change of task or status of every cpu, used by SnapshotCursor
+        :param out: optional (boards x cpus) integer array to reuse
+        :return: (boards x cpus) integer array
+        """
+        if out is None:
+            out = np.empty((len(self.boards), len(self.boards[0].cpus) if self.boards else 0), dtype=np.int64)
+        for idx, board in enumerate(self.boards):
+            board.write_change_versions(out[idx])
+        return out
+
+    def awake_cpus(self):
+        """
+        :return: flat indexes of the cpus updated at every step (the ones not parked)
+        """
+        num_cpus = len(self.boards[0].cpus) if self.boards else 0
+        return np.fromiter((board_idx * num_cpus + idx for board_idx, board in enumerate(self.boards)
+                            for idx in board.awake), dtype=np.int64)
+
+    def read_cpus(self, idx):
+        """
+        Numeric state of some cpus, only the parked ones among them are caught up
+        :param idx: flat indexes of the cpus
+        :return: 1-D structured array with SNAPSHOT_DTYPE, one element per index
+        """
+        num_cpus = len(self.boards[0].cpus) if self.boards else 0
+        cpus = [self.boards[cpu_idx // num_cpus].cpus[cpu_idx % num_cpus] for cpu_idx in np.asarray(idx).tolist()]
+        catch_up_cpus(cpus)
+        out = np.empty(len(cpus), dtype=SNAPSHOT_DTYPE)
+        out['task_id'] = [cpu.current_task.id if cpu.current_task is not None else -1 for cpu in cpus]
+        out['temperature'] = [cpu.temperature for cpu in cpus]
+        out['power'] = [cpu.power for cpu in cpus]
+        out['status'] = [cpu.status for cpu in cpus]
+        return out
+
+    def assign_arrays(self, tasks=None, task_ids=None, statuses=None, task_mask=None, status_mask=None):
+        """
+        Bulk assignment of faults and tasks from (boards x cpus) arrays, the faults are applied first
+        :param tasks: sequence (or dictionary) of tasks indexed by task id
+        :param task_ids: integer array, id of the task to assign (-1 to put the cpu in idle)
+        :param statuses: integer array, status to set
+        :param task_mask: boolean array, False where the task must not change (None to change every cpu)
+        :param status_mask: boolean array, False where the status must not change (None to change every cpu)
+        """
+        num_cpus = len(self.boards[0].cpus) if self.boards else 0
+        status_idx = task_idx = np.zeros(0, dtype=np.int64)
+        # Statuses and task ids are checked before any change
+        if statuses is not None:
+            statuses = np.asarray(statuses).ravel()
+            status_idx = selected_cpus(status_mask, statuses.shape)
+            check_statuses(statuses[status_idx], self.levels)
+        if task_ids is not None:
+            task_ids = np.asarray(task_ids).ravel()
+            task_idx = selected_cpus(task_mask, task_ids.shape)
+            ids = task_ids[task_idx]
+            assigned = [tasks[task_id] for task_id in np.unique(ids[ids >= 0]).tolist()]
+
+        # The parked cpus to change are caught up in one batch
+        catch_up_cpus(self.boards[idx // num_cpus].cpus[idx % num_cpus]
+                      for idx in np.union1d(status_idx, task_idx).tolist())
+
+        for idx in status_idx.tolist():
+            board = self.boards[idx // num_cpus]
+            board.wake(idx % num_cpus)
+            board.cpus[idx % num_cpus].set_status(int(statuses[idx]))
+
+        if task_ids is not None:
+            self._seed_tasks(assigned)
+            for idx in task_idx.tolist():
+                task_id = int(task_ids[idx])
+                board = self.boards[idx // num_cpus]
+                board.wake(idx % num_cpus)
+                board.cpus[idx % num_cpus].assign_task(tasks[task_id] if task_id >= 0 else None)
 
     def interact(self, data=None, is_fault=False):
         if data is not None:
+            if not is_fault:
+                self._seed_tasks([_d for board_data in data.values() if board_data is not None for _d in board_data])
             for idx, board in enumerate(self.boards):
                 board.assign_data(data.get(idx), is_fault)
 
@@ -0,0 +1,64 @@
+import numpy as np
+
+from components import SNAPSHOT_DTYPE
+
+# Row of a delta snapshot: position of the cpu and its numeric state
+DELTA_DTYPE = np.dtype([('board', np.int64), ('cpu', np.int64)] + SNAPSHOT_DTYPE.descr)
+
+
+class SnapshotCursor:
+    """
+    Position of a client in the history of a network: every poll returns only the cpus whose task id or status
+    changed, or whose temperature/power moved beyond the tolerance, since the previous poll of the same cursor.
+    The first poll returns every cpu.
+    Every poll reads a full snapshot, so the parked cpus are caught up and checked against the tolerance too.
+    For the networks keeping a change log in their clock (Network, VectorizedNetwork) a task or status that
+    changed and came back between two polls is also reported.
+    """
+
+    def __init__(self, temperature_tolerance=0.5, power_tolerance=0.5):
+        self.temperature_tolerance = temperature_tolerance
+        self.power_tolerance = power_tolerance
+        # Clock version at the previous poll and values last reported to the client
+        self.version = None
+        self.baseline = None
+        self.state = None
+
+    def poll(self, network):
+        """
+        :param network: the network (any object exposing snapshot)
+        :return: 1-D structured array with DELTA_DTYPE, one row per changed cpu
+        """
+        self.state = network.snapshot(out=self.state)
+        if self.baseline is None or self.baseline.shape != self.state.shape:
+            changed = np.ones(self.state.shape, dtype=bool)
+            self.baseline = self.state.copy()
+        else:
+            changed = ((self.state['task_id'] != self.baseline['task_id']) |
+                       (self.state['status'] != self.baseline['status']) |
+                       (np.abs(self.state['temperature'] - self.baseline['temperature']) > self.temperature_tolerance) |
+                       (np.abs(self.state['power'] - self.baseline['power']) > self.power_tolerance))
+
+        # Changes stamped by the cpus after the previous poll, from the change log if it still covers it
+        clock = getattr(network, 'clock', None)
+        if self.version is not None and hasattr(network, 'change_versions'):
+            logged = clock.changes_since(self.version)
+            if logged is not None:
+                changed.reshape(-1)[logged] = True
+            else:
+                changed |= network.change_versions() >= self.version
+
+        boards, cpus = np.nonzero(changed)
+        delta = np.empty(boards.shape[0], dtype=DELTA_DTYPE)
+        delta['board'] = boards
+        delta['cpu'] = cpus
+        rows = self.state[boards, cpus]
+        for name in SNAPSHOT_DTYPE.names:
+            delta[name] = rows[name]
+        self.baseline[boards, cpus] = rows
+
+        if hasattr(network, 'change_versions') and clock is not None:
+            # Changes from now on are stamped with a newer version
+            clock.new_version()
+            self.version = clock.version
+        return delta
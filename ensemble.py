@@ -0,0 +1,92 @@
+import numpy as np
+
+from parallel_network import ShardedNetwork
+from simulation import Simulation
+from vectorized_components import VectorizedNetwork
+
+# Fields of the snapshot summarized across the replicas
+FIELDS = ['temperature', 'power', 'status']
+
+
+class Ensemble:
+    """
+    Monte Carlo ensemble of independent replicas of the same network configuration.
+    The replicas are stacked along the board axis of one vectorized network (optionally sharded across
+    worker processes), so they share the clock and advance in one batched step.
+    After every step only the statistics across the replicas are stored, never the raw trajectories.
+    """
+
+    def __init__(self, _params, num_replicas, seed=None, num_workers=None, quantiles=(0.05, 0.5, 0.95)):
+        self.num_replicas = num_replicas
+        self.num_boards = _params.get('num_boards')
+        self.num_cpus = _params.get('num_cpus')
+        self.quantiles = np.asarray(quantiles)
+
+        num_boards = num_replicas * self.num_boards
+        if num_workers:
+            self.network = ShardedNetwork(num_boards, self.num_cpus, _params, num_workers=num_workers, seed=seed,
+                                          network_class=VectorizedNetwork)
+        else:
+            # A SeedSequence also with seed None: fresh entropy from the OS
+            self.network = VectorizedNetwork(num_boards, self.num_cpus, None, _params,
+                                             seed=np.random.SeedSequence(seed))
+        self.simulation = Simulation(_object=self.network, delta_time=_params.get('delta_time'))
+
+        # PER STEP STATISTICS
+        self.time = list()
+        self.mean = {field: list() for field in FIELDS}
+        self.quantile = {field: list() for field in FIELDS}
+
+    def interact(self, data, is_fault=False):
+        """
+        Assign the same tasks/faults to every replica
+        :param data: dictionary as in Network.interact, key: id board (of one replica), value: list of tasks/faults
+        """
+        replicated = {replica * self.num_boards + board_id: board_data
+                      for replica in range(self.num_replicas) for board_id, board_data in data.items()}
+        self.network.interact(replicated, is_fault)
+
+    def running_simulation(self, time_interval):
+        # CHECK if the time interval is lesser than the delta time
+        clock = self.simulation.clock
+        time_interval = max(clock.delta_time, time_interval)
+
+        # COMPUTE how many steps to take
+        steps = int(time_interval // clock.delta_time)
+        for _ in range(steps):
+            self.simulation.running_simulation(clock.delta_time)
+            self._record()
+
+    def _record(self):
+        snapshot = self.network.snapshot().reshape(self.num_replicas, self.num_boards, self.num_cpus)
+
+        self.time.append(self.simulation.clock.sim_time)
+        for field in FIELDS:
+            values = snapshot[field]
+            self.mean[field].append(values.mean(axis=0))
+            self.quantile[field].append(np.quantile(values, self.quantiles, axis=0))
+
+    def statistics(self):
+        """
+        :return: dictionary with the time of every recorded step and, for temperature, power and status,
+                 the mean (steps x boards x cpus) and the quantiles (steps x quantiles x boards x cpus)
+                 across the replicas
+        """
+        statistics = {'time': np.asarray(self.time), 'quantiles': self.quantiles}
+        for field in FIELDS:
+            statistics[field] = {
+                'mean': np.asarray(self.mean[field]).reshape(-1, self.num_boards, self.num_cpus),
+                'quantiles': np.asarray(self.quantile[field]).reshape(-1, self.quantiles.size, self.num_boards,
+                                                                      self.num_cpus)
+            }
+        return statistics
+
+    def close(self):
+        if isinstance(self.network, ShardedNetwork):
+            self.network.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,121 @@
+import numpy as np
+
+# Row of a top-k query: position of the cpu and its temperature
+HOTSPOT_DTYPE = np.dtype([('board', np.int64), ('cpu', np.int64), ('temperature', np.float64)])
+
+
+class HotspotIndex:
+    """
+    Index over temperature and power of a network, refreshed by the network after every step
+    (see enable_hotspot_index): per board power sums and maximum temperatures, plus the k hottest cpus.
+    After the first refresh only the cpus stepped are read, plus a rotating slice of the others: a parked cpu
+    (settled around the mean of its level) is caught up and read at least once every max_staleness refreshes.
+    The queries read the index only: top() is O(k), boards_above_power() is O(boards) and above() scans only
+    the boards whose maximum temperature is over the threshold.
+    """
+
+    def __init__(self, num_boards, num_cpus, top_k=50, max_staleness=10):
+        if top_k < 1:
+            raise ValueError('top_k must be at least 1')
+        if max_staleness < 1:
+            raise ValueError('max_staleness must be at least 1')
+        self.top_k = min(top_k, num_boards * num_cpus)
+        self.num_cpus = num_cpus
+        self.max_staleness = max_staleness
+        shape = (num_boards, num_cpus)
+        # First flat index of the next slice of cpus read anyway by an incremental refresh
+        self.stale_start = 0
+
+        # STATE OF THE CPUS (last values read from the network)
+        self.task_id = np.empty(shape, dtype=np.int64)
+        self.temperature = np.empty(shape)
+        self.power = np.empty(shape)
+        self.status = np.empty(shape, dtype=np.int64)
+
+        # AGGREGATES
+        self.board_power = np.zeros(num_boards)
+        self.board_max_temperature = np.zeros(num_boards)
+        self.hottest = np.zeros(0, dtype=HOTSPOT_DTYPE)
+
+    def refresh(self, network, idx=None):
+        """
+        Update the index with the state of the network
+        :param idx: flat indexes of the cpus changed since the previous refresh (e.g. the cpus stepped), the others
+                    keep their values but for the next slice of max_staleness. If None every cpu is read,
+                    catching up the parked ones
+        """
+        if idx is None:
+            network.write_state(self.task_id, self.temperature, self.power, self.status)
+            np.sum(self.power, axis=1, out=self.board_power)
+            np.max(self.temperature, axis=1, out=self.board_max_temperature, initial=-np.inf)
+            self.hottest = self._top(np.arange(self.temperature.size))
+            return
+
+        idx = np.union1d(np.asarray(idx, dtype=np.int64), self._stale_slice())
+        if idx.size == 0:
+            return
+        rows = network.read_cpus(idx)
+        for name in rows.dtype.names:
+            getattr(self, name).reshape(-1)[idx] = rows[name]
+
+        # Aggregates of the boards of the cpus read
+        boards = np.unique(idx // self.num_cpus)
+        self.board_power[boards] = self.power[boards].sum(axis=1)
+        self.board_max_temperature[boards] = self.temperature[boards].max(axis=1)
+
+        # The cpus not read are not hotter than the previous k-th one: the new top k comes from the cpus read and
+        # the previous top k, unless the new k-th one is cooler
+        previous = self.hottest
+        candidates = np.union1d(idx, previous['board'] * self.num_cpus + previous['cpu'])
+        hottest = self._top(candidates)
+        if hottest.size < self.top_k or (previous.size and hottest['temperature'][-1] < previous['temperature'][-1]):
+            # Also the cpus of the boards hotter than the new k-th one
+            boards = np.flatnonzero(self.board_max_temperature >= hottest['temperature'][-1]) if hottest.size \
+                else np.arange(self.board_power.size)
+            candidates = np.union1d(candidates, (boards[:, None] * self.num_cpus + np.arange(self.num_cpus)).ravel())
+            hottest = self._top(candidates)
+        self.hottest = hottest
+
+    def _stale_slice(self):
+        # Next slice of the cpus, in turn, so that every cpu is read within max_staleness refreshes
+        size = self.temperature.size
+        stop = min(size, self.stale_start + -(-size // self.max_staleness))
+        stale = np.arange(self.stale_start, stop)
+        self.stale_start = stop if stop < size else 0
+        return stale
+
+    def _top(self, flat):
+        # k hottest cpus among the flat indexes, in decreasing order of temperature
+        k = min(self.top_k, flat.size)
+        if k == 0:
+            return np.zeros(0, dtype=HOTSPOT_DTYPE)
+        temperature = self.temperature.reshape(-1)[flat]
+        selected = np.argpartition(temperature, flat.size - k)[flat.size - k:]
+        selected = selected[np.argsort(temperature[selected])[::-1]]
+        hottest = np.empty(k, dtype=HOTSPOT_DTYPE)
+        hottest['board'], hottest['cpu'] = np.divmod(flat[selected], self.num_cpus)
+        hottest['temperature'] = temperature[selected]
+        return hottest
+
+    def top(self, k=None):
+        """
+        :param k: number of cpus (at most the top_k of the index, all of them if None)
+        :return: structured array with HOTSPOT_DTYPE, the k hottest cpus in decreasing order of temperature
+        """
+        if k is not None and k > self.top_k:
+            raise ValueError(f"The index keeps only the {self.top_k} hottest cpus")
+        return self.hottest[:k]
+
+    def above(self, threshold):
+        """
+        :return: (boards, cpus) index arrays of the cpus with temperature over the threshold
+        """
+        boards = np.flatnonzero(self.board_max_temperature > threshold)
+        board_idx, cpu_idx = np.nonzero(self.temperature[boards] > threshold)
+        return boards[board_idx], cpu_idx
+
+    def boards_above_power(self, budget):
+        """
+        :return: ids of the boards whose total power is over the budget
+        """
+        return np.flatnonzero(self.board_power > budget)
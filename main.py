@@ -6,8 +6,8 @@ from simulation import *
 
 NO_CHANGE = 0
 
-def custom_print(text):
-    formatted_time = f"{components.SIM_TIME:.2f}"
+def custom_print(text, sim_time):
+    formatted_time = f"{sim_time:.2f}"
     print(f"t[s]: {formatted_time:03}" + " " * (8 - len(formatted_time)), end='\t')
     print(*text)
 
@@ -47,7 +47,7 @@ def simulation_one_board_test(_params):
         # GET Data from cpus
         network_status, debug_text = sim.interact_with_object(is_get_data=True)
         # PRINT the status (OPTIONAL, debugging purpose)
-        custom_print(debug_text)
+        custom_print(debug_text, sim.clock.sim_time)
         # SIMULATE THE NETWORK FOR 1 [virtual] seconds, with delta_time set as 0.5 the function will make 2 steps
         # in the simulation
         sim.running_simulation(time_interval=1.0)
@@ -56,7 +56,7 @@ def simulation_one_board_test(_params):
     # THE PREVIOUS LINE CAN BE REWRITTEN LIKE THIS:
     # sim.interact_with_object(data, is_assign_task=True)
     # network_status, debug_text = sim.interact_with_object(is_get_data=True)
-    # custom_print(debug_text)
+    # custom_print(debug_text, sim.clock.sim_time)
     # sim.running_simulation(time_interval=30.0)
     # network_status, debug_text = sim.interact_with_object(is_get_data=True)
     # BUT YOU WILL GET THE DATA FROM THE NETWORK ONLY AT THE BEGINNING AND AFTER 60 STEPS
@@ -68,7 +68,7 @@ def simulation_one_board_test(_params):
     sim.interact_with_object(data, is_assign_task=True, is_fault=True)
     for _ in range(40):
         network_status, debug_text = sim.interact_with_object(is_get_data=True)
-        custom_print(debug_text)
+        custom_print(debug_text, sim.clock.sim_time)
         sim.running_simulation(time_interval=1.0)
 
     print()
@@ -81,7 +81,7 @@ def simulation_one_board_test(_params):
     sim.interact_with_object(data, is_fault=True)
     for _ in range(1):
         network_status, debug_text = sim.interact_with_object(is_get_data=True)
-        custom_print(debug_text)
+        custom_print(debug_text, sim.clock.sim_time)
         sim.running_simulation(time_interval=0.5)
 
     print()
@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+import pickle
+
+import numpy as np
+
+from components import SNAPSHOT_DTYPE, Clock, Network
+from hotspot import HotspotIndex
+
+
+def _shard_worker(connection, network_class, board_ids, num_cpus, _params, seed_sequence, payload=None):
+    if payload is not None:
+        # RESTORE the shard from a checkpoint
+        network = pickle.loads(payload)
+    else:
+        # Deterministic random stream of the shard, the network also spawns from it the streams of the tasks
+        # it receives
+        _random = np.random.RandomState(np.random.MT19937(seed_sequence))
+
+        network = network_class(num_boards=len(board_ids), num_cpus=num_cpus, _random=_random, _params=_params)
+        # The boards are reported with their global ids
+        if hasattr(network, 'boards'):
+            for board, board_id in zip(network.boards, board_ids):
+                board.id = board_id
+        else:
+            network.board_ids = list(board_ids)
+
+    while True:
+        command, args = connection.recv()
+        if command == 'update':
+            sim_time, delta_time, steps = args
+            network.clock.sim_time = sim_time
+            network.clock.delta_time = delta_time
+            for _ in range(steps):
+                network.update()
+                network.clock.sim_time += network.clock.delta_time
+                network.clock.step += 1
+            connection.send(None)
+        elif command == 'interact':
+            data, is_fault, sim_time = args
+            network.clock.sim_time = sim_time
+            connection.send(network.interact(data, is_fault))
+        elif command == 'assign_arrays':
+            tasks, arrays, sim_time = args
+            network.clock.sim_time = sim_time
+            network.assign_arrays(tasks, *arrays)
+            connection.send(None)
+        elif command == 'state':
+            shape = (len(board_ids), num_cpus)
+            state = np.empty(shape, dtype=np.int64), np.empty(shape), np.empty(shape), np.empty(shape, dtype=np.int64)
+            network.write_state(*state)
+            connection.send(state)
+        elif command == 'checkpoint':
+            connection.send(pickle.dumps(network, protocol=pickle.HIGHEST_PROTOCOL))
+        elif command == 'reset':
+            network.reset()
+            connection.send(None)
+        elif command == 'close':
+            connection.close()
+            return
+
+
+class ShardedNetwork:
+    """
+    Network whose boards are split in contiguous groups (shards), each one living in a worker process.
+    Boards never interact, so the shards are advanced in parallel; the parent process only coordinates
+    the steps and gathers the data. Every shard has its own random streams spawned from the seed, the
+    results are reproducible for a given seed and number of workers.
+    """
+
+    def __init__(self, num_boards, num_cpus, _params=None, num_workers=None, seed=None, network_class=Network,
+                 clock=None):
+        self.clock = clock if clock is not None else Clock()
+        self.num_boards = num_boards
+        self.num_cpus = num_cpus
+        num_workers = min(num_workers or os.cpu_count() or 1, num_boards)
+
+        self.shards = [[int(board_id) for board_id in shard]
+                       for shard in np.array_split(np.arange(num_boards), num_workers)]
+        seed_sequences = np.random.SeedSequence(seed).spawn(num_workers)
+        # Optional HotspotIndex, see enable_hotspot_index
+        self.hotspot_index = None
+        self._start_workers([(network_class, shard, num_cpus, _params, seed_sequence)
+                             for shard, seed_sequence in zip(self.shards, seed_sequences)])
+
+    def _start_workers(self, args_per_shard):
+        self.connections = list()
+        self.workers = list()
+        for args in args_per_shard:
+            parent_connection, child_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_shard_worker, args=(child_connection, *args), daemon=True)
+            worker.start()
+            child_connection.close()
+            self.connections.append(parent_connection)
+            self.workers.append(worker)
+
+    def __getstate__(self):
+        # The state of the shards is collected from the workers (see Simulation.checkpoint)
+        payloads = self._broadcast('checkpoint', [None] * len(self.shards))
+        return {'clock': self.clock, 'num_boards': self.num_boards, 'num_cpus': self.num_cpus,
+                'shards': self.shards, 'payloads': payloads, 'hotspot_index': self.hotspot_index}
+
+    def __setstate__(self, state):
+        # New workers are started from the state of the shards
+        self.clock = state['clock']
+        self.num_boards = state['num_boards']
+        self.num_cpus = state['num_cpus']
+        self.shards = state['shards']
+        self.hotspot_index = state['hotspot_index']
+        self._start_workers([(None, shard, self.num_cpus, None, None, payload)
+                             for shard, payload in zip(self.shards, state['payloads'])])
+
+    def _broadcast(self, command, args_per_shard):
+        for connection, args in zip(self.connections, args_per_shard):
+            connection.send((command, args))
+        # STEP BARRIER: wait for every shard
+        return [connection.recv() for connection in self.connections]
+
+    def set_clock(self, clock):
+        self.clock = clock
+
+    def run_steps(self, steps):
+        args = (self.clock.sim_time, self.clock.delta_time, steps)
+        self._broadcast('update', [args] * len(self.shards))
+        self._refresh_hotspot_index()
+
+    def update(self):
+        self.run_steps(1)
+
+    def reset(self):
+        self._broadcast('reset', [None] * len(self.shards))
+        self._refresh_hotspot_index()
+
+    def enable_hotspot_index(self, top_k=50):
+        """
+        Maintain a HotspotIndex (top-k hottest cpus, per board power and maximum temperature), refreshed
+        after every update
+        :return: the index
+        """
+        self.hotspot_index = HotspotIndex(self.num_boards, self.num_cpus, top_k)
+        self.hotspot_index.refresh(self)
+        return self.hotspot_index
+
+    def _refresh_hotspot_index(self):
+        if self.hotspot_index is not None:
+            self.hotspot_index.refresh(self)
+
+    def snapshot(self, out=None):
+        """
+        Numeric state of the network, no string is formatted
+        :param out: optional (boards x cpus) array with SNAPSHOT_DTYPE to reuse
+        :return: (boards x cpus) structured array with SNAPSHOT_DTYPE
+        """
+        if out is None:
+            out = np.empty((self.num_boards, self.num_cpus), dtype=SNAPSHOT_DTYPE)
+        self.write_state(out['task_id'], out['temperature'], out['power'], out['status'])
+        return out
+
+    def assign_arrays(self, tasks=None, task_ids=None, statuses=None, task_mask=None, status_mask=None):
+        """
+        Bulk assignment of faults and tasks from (boards x cpus) arrays, see Network.assign_arrays
+        """
+        args = list()
+        for shard in self.shards:
+            rows = slice(shard[0], shard[-1] + 1)
+            arrays = [np.asarray(array)[rows] if array is not None else None
+                      for array in (task_ids, statuses, task_mask, status_mask)]
+            args.append((tasks, arrays, self.clock.sim_time))
+        self._broadcast('assign_arrays', args)
+
+    def interact(self, data=None, is_fault=False):
+        if data is not None:
+            # Boards without data receive a list of -1, ignored both by task and fault assignment
+            args = [({local_id: data.get(board_id, [-1] * self.num_cpus) for local_id, board_id in enumerate(shard)},
+                     is_fault, self.clock.sim_time) for shard in self.shards]
+            self._broadcast('interact', args)
+
+        else:
+            output_string = list()
+            output_data = list()
+            for shard_data, shard_string in self._broadcast('interact', [(None, False, self.clock.sim_time)] *
+                                                                        len(self.shards)):
+                output_data.extend(shard_data)
+                output_string.extend(shard_string)
+            return output_data, output_string
+
+    def write_state(self, task_id, temperature, power, status):
+        for shard, shard_state in zip(self.shards, self._broadcast('state', [None] * len(self.shards))):
+            rows = slice(shard[0], shard[-1] + 1)
+            for output, values in zip((task_id, temperature, power, status), shard_state):
+                output[rows] = values
+
+    def close(self):
+        for connection, worker in zip(self.connections, self.workers):
+            if worker.is_alive():
+                connection.send(('close', None))
+            worker.join()
+            connection.close()
+        self.connections = list()
+        self.workers = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,13 +1,38 @@
 import math
+import threading
+from collections import OrderedDict
+
 import numpy as np
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Union
 
 
 # See http://www.turingfinance.com/random-walks-down-wall-street-stochastic-processes-in-python/
 # for further explanations and other types of generators
 
+# Transitions cached per level (and tables per batched generator): the least recently used are dropped, since
+# a catch-up or an event-driven jump can ask for any number of steps
+TRANSITION_CACHE_SIZE = 128
+
+# The levels are shared by every simulation of the process, also across threads
+_CACHE_LOCK = threading.Lock()
+
+
+def _lru_get(cache, key):
+    with _CACHE_LOCK:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _lru_put(cache, key, value):
+    with _CACHE_LOCK:
+        cache[key] = value
+        while len(cache) > TRANSITION_CACHE_SIZE:
+            cache.popitem(last=False)
+
 
 @dataclass
 class OUParameters:
@@ -15,6 +40,173 @@ class OUParameters:
     mu: Union[float, np.ndarray]
     sigma: Union[float, np.ndarray]
     theta: Union[float, np.ndarray]
+    # Derived quantities (e.g. covariance factors), computed once and shared by every generator using the level
+    cache: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+
+def covariance_factor(ou_params):
+    """
+    Lower triangular Cholesky factor of the covariance used for the noise of one step of the process.
+    The factor is computed only the first time and then cached inside the parameters object.
+    :param ou_params: the model parameters object (d-variate version)
+    :return: d x d matrix L such that L @ L.T == sqrt(delta) * sigma
+    """
+    factor = ou_params.cache.get('factor')
+    if factor is None:
+        factor = np.linalg.cholesky(math.sqrt(ou_params.delta) * np.asarray(ou_params.sigma))
+        ou_params.cache['factor'] = factor
+    return factor
+
+
+def transition(ou_params, steps):
+    """
+    Exact Gaussian transition of the process after `steps` consecutive steps at fixed parameters:
+        x_k - mu = A^k (x_0 - mu) + eta,    eta ~ N(0, S - A^k S A^k.T),    A = I - theta * delta
+    where S is the stationary covariance, S = A S A.T + C, and C the covariance of the noise of a single step.
+    A fractional number of steps (a time that is not a multiple of delta) uses the fractional power of A, so that
+    consecutive transitions compose exactly. The result is cached per number of steps (the last
+    TRANSITION_CACHE_SIZE ones).
+    Scalar parameters are handled as 1 x 1 matrices.
+    :param ou_params: the model parameters object
+    :param steps: number of steps k (not necessarily integer)
+    :return: (A^k, L_k), L_k lower triangular factor of the accumulated covariance
+    """
+    if steps < 0:
+        raise ValueError('The OU generator cannot go back in time')
+    if abs(steps - round(steps)) < 1e-9:
+        steps = int(round(steps))
+    transitions = ou_params.cache.get('transitions')
+    if transitions is None:
+        transitions = ou_params.cache.setdefault('transitions', OrderedDict())
+    cached = _lru_get(transitions, steps)
+    if cached is not None:
+        return cached
+
+    step_matrix, step_covariance = _step_matrices(ou_params)
+    if isinstance(steps, int):
+        power = np.linalg.matrix_power(step_matrix, steps)
+    else:
+        power = _fractional_power(step_matrix, steps)
+    try:
+        # Closed form through the stationary covariance S = A S A.T + C (requires a mean-reverting process)
+        stationary = _stationary_covariance(ou_params, step_matrix, step_covariance)
+        covariance = stationary - power @ stationary @ power.T
+        factor = np.linalg.cholesky((covariance + covariance.T) / 2) if steps > 0 else np.zeros_like(power)
+    except np.linalg.LinAlgError:
+        if not isinstance(steps, int):
+            raise ValueError('Fractional steps require a mean-reverting process')
+        covariance = np.zeros_like(power)
+        step_power = np.eye(power.shape[0])
+        for _ in range(steps):
+            covariance += step_power @ step_covariance @ step_power.T
+            step_power = step_power @ step_matrix
+        factor = np.linalg.cholesky(covariance) if steps > 0 else np.zeros_like(power)
+
+    _lru_put(transitions, steps, (power, factor))
+    return power, factor
+
+
+def time_transition(ou_params, elapsed):
+    """
+    Exact transition of the process after `elapsed` units of time, i.e. elapsed / delta steps (see transition)
+    """
+    return transition(ou_params, elapsed / ou_params.delta)
+
+
+def transition_coefficients(ou_params, elapsed):
+    """
+    Same transition of time_transition as a tuple of python floats, for scalar updates without numpy arrays:
+    mu, then A^k row by row, then the lower triangle of L_k row by row. Cached as the transitions.
+    :param ou_params: the model parameters object (d-variate version)
+    :param elapsed: time interval, in the same unit of delta
+    """
+    steps = elapsed / ou_params.delta
+    if abs(steps - round(steps)) < 1e-9:
+        steps = int(round(steps))
+    transitions = ou_params.cache.get('transitions')
+    if transitions is None:
+        transitions = ou_params.cache.setdefault('transitions', OrderedDict())
+    key = ('coefficients', steps)
+    coefficients = _lru_get(transitions, key)
+    if coefficients is None:
+        power, factor = transition(ou_params, steps)
+        coefficients = tuple(np.asarray(ou_params.mu, dtype=float).tolist() + power.ravel().tolist() +
+                             factor[np.tril_indices(factor.shape[0])].tolist())
+        _lru_put(transitions, key, coefficients)
+    return coefficients
+
+
+def stationary_std(ou_params):
+    """
+    Standard deviations of the stationary distribution of a mean-reverting process, as python floats (cached)
+    :param ou_params: the model parameters object
+    :return: tuple with the standard deviation of every component
+    """
+    std = ou_params.cache.get('stationary_std')
+    if std is None:
+        step_matrix, step_covariance = _step_matrices(ou_params)
+        std = tuple(np.sqrt(np.diag(_stationary_covariance(ou_params, step_matrix, step_covariance))).tolist())
+        ou_params.cache['stationary_std'] = std
+    return std
+
+
+def _splitmix64(value):
+    # Integer arithmetic modulo 2^64, the overflows are intended
+    with np.errstate(over='ignore'):
+        value = (value ^ (value >> 30)) * np.uint64(0xBF58476D1CE4E5B9)
+        value = (value ^ (value >> 27)) * np.uint64(0x94D049BB133111EB)
+    return value ^ (value >> 31)
+
+
+_GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def keyed_normals(key, index, step):
+    """
+    Pairs of independent standard normals that are a function of (key, index, step) only (counter-based: a
+    splitmix64 hash of the triple and a Box-Muller transform), whatever the order and the grouping of the draws
+    :param key: integer key of the stream (or one per element), e.g. one per network
+    :param index: integer array, e.g. the flat indexes of the cpus
+    :param step: integer array (or scalar), e.g. the steps of the clock
+    :return: (z0, z1) float arrays with the broadcast shape of the arguments
+    """
+    stream = _splitmix64(np.asarray(key, dtype=np.uint64) ^ _splitmix64(np.asarray(index, dtype=np.uint64)))
+    with np.errstate(over='ignore'):
+        bits = _splitmix64(stream + np.asarray(step, dtype=np.uint64) * _GOLDEN_GAMMA)
+    # The two halves of the hash are the two uniforms of the transform
+    radius = np.sqrt(-2.0 * np.log(((bits >> 32) + 1) * 2.0 ** -32))
+    angle = (bits & np.uint64(0xFFFFFFFF)) * (2.0 * math.pi * 2.0 ** -32)
+    return radius * np.cos(angle), radius * np.sin(angle)
+
+
+def _step_matrices(ou_params):
+    # Matrix A and covariance C of one step of the process (scalar parameters as 1 x 1 matrices)
+    theta = np.atleast_2d(ou_params.theta)
+    step_matrix = np.eye(theta.shape[0]) - theta * ou_params.delta
+    if np.ndim(ou_params.sigma) == 0:
+        step_covariance = np.atleast_2d(ou_params.delta * ou_params.sigma ** 2)
+    else:
+        step_covariance = math.sqrt(ou_params.delta) * np.asarray(ou_params.sigma)
+    return step_matrix, step_covariance
+
+
+def _fractional_power(matrix, exponent):
+    eigenvalues, eigenvectors = np.linalg.eig(matrix)
+    if np.any((np.abs(eigenvalues.imag) < 1e-12) & (eigenvalues.real <= 0)):
+        raise ValueError('Fractional steps require a step matrix without non-positive real eigenvalues')
+    return ((eigenvectors * eigenvalues ** exponent) @ np.linalg.inv(eigenvectors)).real
+
+
+def _stationary_covariance(ou_params, step_matrix, step_covariance):
+    stationary = ou_params.cache.get('stationary')
+    if stationary is None:
+        if np.max(np.abs(np.linalg.eigvals(step_matrix))) >= 1.0:
+            raise np.linalg.LinAlgError('The process is not mean-reverting')
+        dim = step_matrix.shape[0]
+        stationary = np.linalg.solve(np.eye(dim * dim) - np.kron(step_matrix, step_matrix),
+                                     step_covariance.ravel()).reshape(dim, dim)
+        ou_params.cache['stationary'] = stationary
+    return stationary
 
 
 class OrnsteinUhlenbeck:
@@ -22,6 +214,7 @@ class OrnsteinUhlenbeck:
     Essentially, this class is a random number generator that produces a random walk according to the
     mean-reverting Ornstein-Uhlenbeck process
     """
+    __slots__ = ('ou_params', 'random', 'value', 'time_clock')
 
     def __init__(self, ou_params, initial_value=None, random=None):
         self.ou_params = ou_params
@@ -32,24 +225,50 @@ class OrnsteinUhlenbeck:
             self.value = ou_params.mu
         self.time_clock = 0
 
-    def value_at(self, time_clock):
+    def value_at(self, time_clock, exact=False):
         """
         This method returns the rate levels of a mean-reverting Ornstein Uhlenbeck process.
         :param time_clock: the model parameters object
+        :param exact: if True, jump to time_clock with a single draw of the exact multi-step transition
         :return: the value for the Ornstein Uhlenbeck process at the given time
         """
 
         assert time_clock >= self.time_clock, 'The OU generator cannot go back in time'
 
+        if exact:
+            return self.advance(time_clock - self.time_clock)
+
         # Update stochastic process, if required
         for i in range(self.time_clock, time_clock):
-            sqrt_delta_sigma = math.sqrt(self.ou_params.delta) * self.ou_params.sigma
-            randomness = self.random.normal(loc=0.0, scale=sqrt_delta_sigma)
-            drift = self.ou_params.theta * (self.ou_params.mu - self.value) * self.ou_params.delta
-            self.value += drift + randomness
+            self.step()
 
         return self.value
 
+    def step(self):
+        sqrt_delta_sigma = math.sqrt(self.ou_params.delta) * self.ou_params.sigma
+        randomness = self.random.normal(loc=0.0, scale=sqrt_delta_sigma)
+        drift = self.ou_params.theta * (self.ou_params.mu - self.value) * self.ou_params.delta
+        self.value += drift + randomness
+
+    def advance(self, steps):
+        """
+        Advance the process by a number of steps in O(1), sampling the exact multi-step transition
+        :param steps: number of steps
+        :return: the value for the Ornstein Uhlenbeck process after the steps
+        """
+        power, factor = transition(self.ou_params, steps)
+        mu = self.ou_params.mu
+        self.value = mu + power[0, 0] * (self.value - mu) + factor[0, 0] * self.random.standard_normal()
+        return self.value
+
+    def advance_time(self, elapsed):
+        """
+        Advance the process by a time interval (any multiple of delta, also fractional), exact transition
+        :param elapsed: time interval, in the same unit of delta
+        :return: the value for the Ornstein Uhlenbeck process after the time interval
+        """
+        return self.advance(elapsed / self.ou_params.delta)
+
 
 class MultivariateOrnsteinUhlenbeck(OrnsteinUhlenbeck):
     """
@@ -59,26 +278,153 @@ class MultivariateOrnsteinUhlenbeck(OrnsteinUhlenbeck):
     :param sigma: d x d matrix
     :param theta: d x d matrix
     """
+    __slots__ = ()
 
     def __init__(self, ou_params, initial_value=None, random=None):
         super().__init__(ou_params, initial_value, random)
-        self.value = self.value.copy()
-        self.mean = np.array([0.0] * self.ou_params.mu.shape[0])
+        self.value = np.array(self.value, dtype=float)
+
+    def step(self):
+        randomness = covariance_factor(self.ou_params) @ self.random.standard_normal(self.value.shape[0])
+        drift = np.dot(self.ou_params.theta, (self.ou_params.mu - self.value)) * self.ou_params.delta
+        self.value += drift + randomness
+
+    def advance(self, steps):
+        power, factor = transition(self.ou_params, steps)
+        mu = self.ou_params.mu
+        self.value[:] = mu + power @ (self.value - mu) + factor @ self.random.standard_normal(self.value.shape[0])
+        return self.value
+
+
+class BatchedMultivariateOrnsteinUhlenbeck:
+    """
+    N independent d-variate Ornstein-Uhlenbeck processes, each one following its own level.
+    All the processes are advanced together: the standard normals are drawn as one (N, d) block and
+    correlated with the covariance factors precomputed for every level.
+    :param levels: list of model parameters objects, indexed by level
+    :param size: number of processes N
+    """
+    __slots__ = ('levels', 'random', 'level', 'value', 'time_clock', 'mu', 'theta_delta', 'factor', 'tables')
+
+    def __init__(self, levels, size, initial_value=None, random=None):
+        self.levels = levels
+        self.random = random
+        self.level = np.zeros(size, dtype=np.int64)
+        if initial_value is not None:
+            self.value = np.array(np.broadcast_to(initial_value, (size, levels[0].mu.shape[0])), dtype=float)
+        else:
+            self.value = np.tile(np.asarray(levels[0].mu, dtype=float), (size, 1))
+        self.time_clock = 0
 
-    def value_at(self, time_clock):
+        # PER LEVEL TABLES
+        self.mu = np.stack([np.asarray(ou_params.mu, dtype=float) for ou_params in levels])
+        self.theta_delta = np.stack([np.asarray(ou_params.theta) * ou_params.delta for ou_params in levels])
+        self.factor = np.stack([covariance_factor(ou_params) for ou_params in levels])
+        # Transitions of every level after a time interval (see advance_time), stacked and cached per interval
+        # (the last TRANSITION_CACHE_SIZE ones)
+        self.tables = OrderedDict()
+
+    def set_level(self, idx, level):
+        self.level[idx] = level
+
+    def value_at(self, time_clock, exact=False):
         """
-        This method returns the rate levels of a mean-reverting Ornstein Uhlenbeck process.
+        This method returns the rate levels of all the mean-reverting Ornstein Uhlenbeck processes.
         :param time_clock: the model parameters object
-        :return: the value for the Ornstein Uhlenbeck process at the given time
+        :param exact: if True, jump to time_clock with a single draw of the exact multi-step transition
+        :return: (N, d) array with the values of the processes at the given time
         """
 
         assert time_clock >= self.time_clock, 'The OU generator cannot go back in time'
 
-        # Update stochastic process, if required
+        if exact:
+            return self.advance(time_clock - self.time_clock)
+
+        # Update stochastic processes, if required
         for i in range(self.time_clock, time_clock):
-            sqrt_delta_sigma = math.sqrt(self.ou_params.delta) * self.ou_params.sigma
-            randomness = self.random.multivariate_normal(mean=self.mean, cov=sqrt_delta_sigma)
-            drift = np.dot(self.ou_params.theta, (self.ou_params.mu - self.value)) * self.ou_params.delta
-            self.value += drift + randomness
+            self.step()
+
+        return self.value
+
+    def step(self):
+        normals = self.random.standard_normal(self.value.shape)
+        randomness = np.einsum('nij,nj->ni', self.factor[self.level], normals)
+        drift = np.einsum('nij,nj->ni', self.theta_delta[self.level], self.mu[self.level] - self.value)
+        self.value += drift + randomness
+
+    def advance(self, steps, idx=None):
+        """
+        Advance a subset of the processes with the exact multi-step transition, in one batched draw
+        :param steps: number of steps (integer), scalar or one value per selected process
+        :param idx: indexes of the processes to advance (all of them if None)
+        :return: (N, d) array with the values of the processes
+        """
+        idx = np.arange(self.value.shape[0]) if idx is None else np.asarray(idx).reshape(-1)
+        steps = np.asarray(steps)
+        if np.any(steps < 0):
+            raise ValueError('The OU generator cannot go back in time')
+        if np.any(steps != np.round(steps)):
+            raise ValueError('Fractional number of steps, use advance_time')
+        if idx.size == 0:
+            return self.value
+        steps = np.broadcast_to(steps.astype(np.int64), idx.shape)
+        level = self.level[idx]
+
+        # One transition per distinct (level, steps) pair
+        keys, inverse = np.unique(np.stack([level, steps]), axis=1, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        powers = np.empty((keys.shape[1],) + self.factor.shape[1:])
+        factors = np.empty_like(powers)
+        for j, (level_idx, level_steps) in enumerate(keys.T):
+            powers[j], factors[j] = transition(self.levels[level_idx], int(level_steps))
+
+        mu = self.mu[level]
+        normals = self.random.standard_normal((idx.size, self.value.shape[1]))
+        self.value[idx] = (mu + np.einsum('nij,nj->ni', powers[inverse], self.value[idx] - mu) +
+                           np.einsum('nij,nj->ni', factors[inverse], normals))
+        return self.value
+
+    def _tables(self, elapsed):
+        tables = _lru_get(self.tables, elapsed)
+        if tables is None:
+            transitions = [time_transition(ou_params, elapsed) for ou_params in self.levels]
+            tables = (np.stack([power for power, _ in transitions]), np.stack([factor for _, factor in transitions]))
+            _lru_put(self.tables, elapsed, tables)
+        return tables
+
+    def advance_time(self, elapsed, idx=None, random=None):
+        """
+        Advance a subset of the processes by a time interval with the exact transition of their levels,
+        whatever the delta of the levels (also fractional multiples)
+        :param elapsed: time interval, scalar or one value per selected process
+        :param idx: indexes of the processes to advance (all of them if None)
+        :param random: stream of the normals (the stream of the generator if None)
+        :return: (N, d) array with the values of the processes
+        """
+        random = random if random is not None else self.random
+        elapsed = np.asarray(elapsed, dtype=float)
+        if elapsed.ndim == 0:
+            groups = [(float(elapsed), idx)]
+        else:
+            idx = np.arange(self.value.shape[0]) if idx is None else np.asarray(idx).reshape(-1)
+            intervals, inverse = np.unique(np.broadcast_to(elapsed, idx.shape), return_inverse=True)
+            inverse = inverse.reshape(-1)
+            groups = [(float(interval), idx[inverse == j]) for j, interval in enumerate(intervals)]
 
+        for interval, group in groups:
+            powers, factors = self._tables(interval)
+            if group is None:
+                level = self.level
+                value = self.value
+            else:
+                level = self.level[group]
+                value = self.value[group]
+            mu = self.mu[level]
+            normals = random.standard_normal(value.shape)
+            value = (mu + np.einsum('nij,nj->ni', powers[level], value - mu) +
+                     np.einsum('nij,nj->ni', factors[level], normals))
+            if group is None:
+                self.value[:] = value
+            else:
+                self.value[group] = value
         return self.value
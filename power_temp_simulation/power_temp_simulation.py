@@ -4,94 +4,144 @@ import numpy as np
 from power_temp_simulation.ornstein_uhlenbeck import OUParameters, OrnsteinUhlenbeck, MultivariateOrnsteinUhlenbeck
 
 
+def _table_value(value):
+    value = np.array(value, dtype=float)
+    if value.ndim == 0:
+        return float(value)
+    value.setflags(write=False)
+    return value
+
+
+def build_levels(levels_params):
+    """
+    Build a table of levels shared (read only) by every simulator that references it
+    :param levels_params: list of dictionaries with mu, sigma, theta and delta of every level, indexed by level
+    :return: tuple of OUParameters (with read only arrays), indexed by level
+    """
+    return tuple(
+        OUParameters(
+            mu=_table_value(level_params['mu']),
+            delta=level_params.get('delta', 1.0),
+            sigma=_table_value(level_params['sigma']),
+            theta=_table_value(level_params['theta'])
+        ) for level_params in levels_params
+    )
+
+
+# DEFAULT LEVELS, defined once and shared by every simulator
+POWER_LEVELS = build_levels([
+    dict(
+        mu=12.0,        # Average value
+        delta=1.0,      # Rate of time
+        sigma=0.025,    # Volatility of the stochastic process
+        theta=0.3       # Rate of mean reversion for Ornstein Uhlenbeck
+    ),
+    dict(
+        mu=18.0,        # average value
+        delta=1.0,      # Rate of time
+        sigma=0.050,    # Volatility of the stochastic process
+        theta=0.2       # Rate of mean reversion for Ornstein Uhlenbeck
+    ),
+    dict(
+        mu=34.0,        # Average value
+        delta=1.0,      # Rate of time
+        sigma=0.010,    # Volatility of the stochastic process
+        theta=0.1       # Rate of mean reversion for Ornstein Uhlenbeck
+    ),
+    dict(
+        mu=52,          # Average value
+        delta=1.0,      # Rate of time
+        sigma=1.0,      # Volatility of the stochastic process
+        theta=0.1       # Rate of mean reversion for Ornstein Uhlenbeck
+    )
+])
+
+POWER_TEMPERATURE_LEVELS = build_levels([
+    dict(
+        mu=[12.0, 45.0],            # Average value
+        delta=1.0,                  # Rate of time
+        sigma=[[0.025, 0.001],
+               [0.001, 0.050]],     # Volatility of the stochastic process
+        theta=[[0.3, 0.0],
+               [0.0, 0.2]]          # Rate of mean reversion for Ornstein Uhlenbeck
+    ),
+    dict(
+        mu=[18.0, 55.0],            # Average value
+        delta=1.0,                  # Rate of time
+        sigma=[[0.050, 0.001],
+               [0.001, 0.75]],      # Volatility of the stochastic process
+        theta=[[0.2, 0.0],
+               [0.0, 0.2]]          # Rate of mean reversion for Ornstein Uhlenbeck
+    ),
+    dict(
+        mu=[34.0, 75.0],            # Average value
+        delta=1.0,                  # Rate of time
+        sigma=[[0.100,  0.010],
+               [0.010,  0.150]],    # Volatility of the stochastic process
+        theta=[[0.1, -0.001],
+               [-0.001, 0.1]]       # Rate of mean reversion for Ornstein Uhlenbeck
+    ),
+    dict(
+        mu=[52.0, 85.0],            # Average value
+        delta=1.0,                  # Rate of time
+        sigma=[[0.150,  0.010],
+               [0.010,  0.200]],    # Volatility of the stochastic process
+        theta=[[0.1, -0.010],
+               [-0.010, 0.1]]       # Rate of mean reversion for Ornstein Uhlenbeck
+    )
+])
+
+
 class PowerSimulator:
-    def __init__(self, random=None, level=0):
+    __slots__ = ('random', 'level', 'levels', 'generator')
+
+    def __init__(self, random=None, level=0, levels=None):
         self.random = random
         self.level = level
-        self.levels = dict()
-        self.levels[0] = OUParameters(
-            mu=12.0,        # Average value
-            delta=1.0,      # Rate of time
-            sigma=0.025,    # Volatility of the stochastic process
-            theta=0.3       # Rate of mean reversion for Ornstein Uhlenbeck
-        )
-        self.levels[1] = OUParameters(
-            mu=18.0,        # average value
-            delta=1.0,      # Rate of time
-            sigma=0.050,    # Volatility of the stochastic process
-            theta=0.2       # Rate of mean reversion for Ornstein Uhlenbeck
-        )
-        self.levels[2] = OUParameters(
-            mu=34.0,        # Average value
-            delta=1.0,      # Rate of time
-            sigma=0.010,    # Volatility of the stochastic process
-            theta=0.1       # Rate of mean reversion for Ornstein Uhlenbeck
-        )
-        self.levels[3] = OUParameters(
-            mu=52,          # Average value
-            delta=1.0,      # Rate of time
-            sigma=1.0,      # Volatility of the stochastic process
-            theta=0.1       # Rate of mean reversion for Ornstein Uhlenbeck
-        )
+        # Levels are shared by every simulator, the simulator only references them by level index
+        self.levels = levels if levels is not None else POWER_LEVELS
         self.generator = OrnsteinUhlenbeck(self.levels[level], random=self.random)
 
     def set_level(self, level):
-        if level not in self.levels:
-            raise f"Unknown level: {level}"
+        if not 0 <= level < len(self.levels):
+            raise ValueError(f"Unknown level: {level}")
 
         self.generator.ou_params = self.levels[level]
 
-    def value_at(self, time_clock):
-        return self.generator.value_at(time_clock)
+    def value_at(self, time_clock, exact=False):
+        return self.generator.value_at(time_clock, exact)
+
+    def advance(self, steps):
+        return self.generator.advance(steps)
+
+    def advance_time(self, elapsed):
+        return self.generator.advance_time(elapsed)
 
 
 class PowerTemperatureSimulator:
-    def __init__(self, random=None, level=0):
+    __slots__ = ('random', 'level', 'levels', 'generator')
+
+    def __init__(self, random=None, level=0, levels=None):
         self.random = random
         self.level = level
-        self.levels = dict()
-        self.levels[0] = OUParameters(
-            mu=np.array([12.0, 45.0]),          # Average value
-            delta=1.0,                          # Rate of time
-            sigma=np.array([[0.025, 0.001],
-                            [0.001, 0.050]]),   # Volatility of the stochastic process
-            theta=np.array([[0.3, 0.0],
-                            [0.0, 0.2]])        # Rate of mean reversion for Ornstein Uhlenbeck
-        )
-        self.levels[1] = OUParameters(
-            mu=np.array([18.0, 55.0]),          # Average value
-            delta=1.0,                          # Rate of time
-            sigma=np.array([[0.050, 0.001],
-                            [0.001, 0.75]]),   # Volatility of the stochastic process
-            theta=np.array([[0.2, 0.0],
-                            [0.0, 0.2]])        # Rate of mean reversion for Ornstein Uhlenbeck
-        )
-        self.levels[2] = OUParameters(
-            mu=np.array([34.0, 75.0]),          # Average value
-            delta=1.0,                          # Rate of time
-            sigma=np.array([[0.100,  0.010],
-                            [0.010,  0.150]]),  # Volatility of the stochastic process
-            theta=np.array([[0.1, -0.001],
-                            [-0.001, 0.1]])     # Rate of mean reversion for Ornstein Uhlenbeck
-        )
-        self.levels[3] = OUParameters(
-            mu=np.array([52.0, 85.0]),          # Average value
-            delta=1.0,                          # Rate of time
-            sigma=np.array([[0.150,  0.010],
-                            [0.010,  0.200]]),  # Volatility of the stochastic process
-            theta=np.array([[0.1, -0.010],
-                            [-0.010, 0.1]])     # Rate of mean reversion for Ornstein Uhlenbeck
-        )
+        # Levels are shared by every simulator, the simulator only references them by level index
+        self.levels = levels if levels is not None else POWER_TEMPERATURE_LEVELS
         self.generator = MultivariateOrnsteinUhlenbeck(self.levels[level], random=self.random)
 
     def set_level(self, level):
-        if level not in self.levels:
-            raise f"Unknown level: {level}"
+        if not 0 <= level < len(self.levels):
+            raise ValueError(f"Unknown level: {level}")
 
         self.generator.ou_params = self.levels[level]
 
-    def value_at(self, time_clock):
-        return self.generator.value_at(time_clock)
+    def value_at(self, time_clock, exact=False):
+        return self.generator.value_at(time_clock, exact)
+
+    def advance(self, steps):
+        return self.generator.advance(steps)
+
+    def advance_time(self, elapsed):
+        return self.generator.advance_time(elapsed)
 
 #
 # if __name__ == '__main__':
@@ -0,0 +1,48 @@
+from collections import defaultdict
+
+
+class SimulationProfiler:
+    """
+    Accumulate wall time and number of calls of every phase of the simulation step, per board.
+    Pass it as Simulation(..., profiler=profiler): without a profiler the simulation runs the
+    non-instrumented code path.
+    Phases: 'status' (prob_to_change_status), 'power_temperature' (simulate_params), 'task' (task bookkeeping),
+    'update' (networks without per-phase instrumentation), 'interact' (interact_with_object)
+    """
+
+    def __init__(self):
+        self.time = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def add(self, phase, board_id, elapsed):
+        key = (phase, board_id)
+        self.time[key] += elapsed
+        self.calls[key] += 1
+
+    def reset(self):
+        self.time.clear()
+        self.calls.clear()
+
+    def stats(self):
+        """
+        :return: dictionary phase -> {'time': total seconds, 'calls': number of calls,
+                                      'boards': {board id: {'time', 'calls'}}}
+                 board id is None for the phases not split per board
+        """
+        stats = dict()
+        for (phase, board_id), elapsed in self.time.items():
+            phase_stats = stats.setdefault(phase, {'time': 0.0, 'calls': 0, 'boards': dict()})
+            calls = self.calls[(phase, board_id)]
+            phase_stats['time'] += elapsed
+            phase_stats['calls'] += calls
+            phase_stats['boards'][board_id] = {'time': elapsed, 'calls': calls}
+        return stats
+
+    def __str__(self):
+        stats = self.stats()
+        total = sum(phase_stats['time'] for phase_stats in stats.values()) or 1.0
+        lines = [f"{'phase':20} {'time[s]':>10} {'calls':>10} {'%':>6}"]
+        for phase, phase_stats in sorted(stats.items(), key=lambda item: -item[1]['time']):
+            lines.append(f"{phase:20} {phase_stats['time']:10.4f} {phase_stats['calls']:10} "
+                         f"{100 * phase_stats['time'] / total:6.1f}")
+        return "\n".join(lines)
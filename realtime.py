@@ -0,0 +1,206 @@
+import collections
+import functools
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Policies applied when a step overruns its tick
+CATCH_UP = 'catch_up'   # run the missed steps back to back (at most max_catch_up), then skip the rest
+SKIP = 'skip'           # drop the missed steps, the simulation falls behind the wall clock
+
+
+class PacedRunner:
+    """
+    Advance a simulation at a fixed multiple of the wall clock in a background thread.
+    The ticks follow absolute deadlines (start + n * delta_time / speed), so the error of a tick does not
+    accumulate; the last part of the wait is spent busy-waiting to lower the jitter.
+    Every access to the simulation while the runner is active goes through the command queue (submit, interact):
+    the commands are applied by the tick thread at the step boundaries.
+    """
+
+    def __init__(self, simulation, speed=1.0, policy=CATCH_UP, max_catch_up=10, spin=0.0005, history=10000):
+        """
+        :param simulation: the Simulation to advance
+        :param speed: virtual seconds per wall clock second
+        :param policy: CATCH_UP or SKIP, what to do with the ticks missed after an overrun
+        :param max_catch_up: maximum number of missed steps run back to back after an overrun
+        :param spin: seconds before the deadline spent busy-waiting instead of sleeping
+        :param history: number of last ticks used for the latency percentiles
+        """
+        if policy not in (CATCH_UP, SKIP):
+            raise ValueError(f"Unknown policy {policy}")
+        self.simulation = simulation
+        self.speed = speed
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.spin = spin
+
+        self.commands = queue.Queue()
+        self.thread = None
+        self.running = threading.Event()
+        # Exception raised by the simulation in the tick thread, it stops the runner
+        self.error = None
+
+        # TICK STATISTICS
+        self.history = history
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.ticks = 0
+        self.steps = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.latency_max = 0.0
+        self.latency_total = 0.0
+        self.step_time_max = 0.0
+        self.step_time_total = 0.0
+        self.latencies = collections.deque(maxlen=self.history)
+
+    @property
+    def period(self):
+        return self.simulation.clock.delta_time / self.speed
+
+    def start(self):
+        if self.thread is not None:
+            raise RuntimeError('The runner is already started')
+        self.error = None
+        self.running.set()
+        self.thread = threading.Thread(target=self._run, name='paced-runner', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the tick thread, the commands still in the queue are applied before returning.
+        If the tick thread stopped on an exception, the commands fail with it and it is raised
+        """
+        if self.thread is None:
+            return
+        self.running.clear()
+        self.thread.join()
+        self.thread = None
+        if self.error is not None:
+            self._fail_commands()
+            raise self.error
+        self._apply_commands()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Queue a call to be applied by the tick thread at the next step boundary
+        :return: Future with the result of the call
+        """
+        future = Future()
+        self.commands.put((future, functools.partial(function, *args, **kwargs)))
+        if self.error is not None:
+            self._fail_commands()
+        elif self.thread is None:
+            self._apply_commands()
+        return future
+
+    def interact(self, *args, **kwargs):
+        """
+        Queue a call to Simulation.interact_with_object, same arguments
+        :return: Future with the result of the call
+        """
+        return self.submit(self.simulation.interact_with_object, *args, **kwargs)
+
+    def _apply_commands(self):
+        while True:
+            try:
+                future, command = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(command())
+            except Exception as error:
+                future.set_exception(error)
+
+    def _fail_commands(self):
+        while True:
+            try:
+                future, _ = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            if future.set_running_or_notify_cancel():
+                future.set_exception(self.error)
+
+    def _wait(self, deadline):
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while time.perf_counter() < deadline:
+            pass
+
+    def _run(self):
+        try:
+            self._tick_loop()
+        except Exception as error:
+            # The runner stops: the commands queued and submitted from now on fail with the error
+            self.error = error
+            self.running.clear()
+            self._fail_commands()
+
+    def _tick_loop(self):
+        period = self.period
+        deadline = time.perf_counter() + period
+        while self.running.is_set():
+            self._apply_commands()
+            self._wait(deadline)
+
+            # Steps due at this tick: more than one if the previous tick overran
+            start = time.perf_counter()
+            due = 1 + max(0, math.floor((start - deadline) / period))
+            steps = min(due, 1 + self.max_catch_up) if self.policy == CATCH_UP else 1
+            self.simulation.run_steps(steps)
+            end = time.perf_counter()
+
+            # STATISTICS
+            latency = start - deadline
+            self.ticks += 1
+            self.steps += steps
+            self.skipped += due - steps
+            if due > 1:
+                self.overruns += 1
+            self.latencies.append(latency)
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.step_time_total += end - start
+            self.step_time_max = max(self.step_time_max, end - start)
+
+            # Absolute deadlines: the error of a tick is not carried to the next ones
+            deadline += due * period
+
+    def stats(self):
+        """
+        :return: dictionary with the number of ticks, steps, skipped steps and overruns (ticks started after
+                 the deadline of the next one), the latency of the tick start after its deadline (mean, max,
+                 99th percentile of the last ticks) and the wall time of the steps (mean, max), in seconds.
+                 Raise the exception that stopped the tick thread, if any
+        """
+        if self.error is not None:
+            raise self.error
+        ticks = max(1, self.ticks)
+        latencies = np.asarray(self.latencies)
+        return {
+            'ticks': self.ticks,
+            'steps': self.steps,
+            'skipped': self.skipped,
+            'overruns': self.overruns,
+            'latency_mean': self.latency_total / ticks,
+            'latency_max': self.latency_max,
+            'latency_p99': float(np.quantile(latencies, 0.99)) if latencies.size else 0.0,
+            'step_time_mean': self.step_time_total / ticks,
+            'step_time_max': self.step_time_max
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,328 @@
+"""
+Asyncio service hosting independent simulation sessions.
+
+The requests are JSON objects, one per line on a unix/TCP socket (or passed directly with the loopback transport):
+    {"id": 1, "op": "create", "params": {...}, "network": "vectorized", "seed": 0, "event_driven": false}
+    {"id": 2, "op": "step", "session": 0, "steps": 10}                  (or "time_interval": 5.0)
+    {"id": 3, "op": "assign", "session": 0, "task_ids": [[...]], "mask": [[...]]}
+    {"id": 4, "op": "fault", "session": 0, "statuses": [[...]], "mask": [[...]]}
+    {"id": 5, "op": "snapshot", "session": 0}
+    {"id": 6, "op": "batch", "session": 0, "requests": [{"op": "assign", ...}, {"op": "step", ...}, ...]}
+    {"id": 7, "op": "close", "session": 0}
+every response carries the id of its request: {"id": 1, "ok": true, "result": ...} or {"id": 1, "ok": false,
+"error": "..."}. The requests of a connection are served concurrently, the requests of one session in order.
+
+Run a server from the root of the repository:
+    python -m service --unix /tmp/simulation.sock
+    python -m service --host 127.0.0.1 --port 8765
+"""
+import argparse
+import asyncio
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from components import Network, Task, spawn_generators
+from simulation import EventDrivenSimulation, Simulation
+from vectorized_components import VectorizedNetwork
+
+NETWORKS = {
+    'network': Network,
+    'vectorized': VectorizedNetwork
+}
+
+# Maximum size of a request/response line
+LINE_LIMIT = 2 ** 26
+
+
+class Session:
+    """
+    One simulation hosted by the service: the network, its tasks and the lock serializing its requests
+    """
+
+    def __init__(self, _params, network='vectorized', seed=None, event_driven=False):
+        # Random streams of the network and of the tasks spawned from the seed
+        network_seed, task_seed = np.random.SeedSequence(seed).spawn(2)
+        task_params = _params.get('task', dict())
+        self.tasks = {int(idx): Task(int(idx), base_execution_time=task_params[idx]['base_execution_time'],
+                                     std=task_params[idx]['std'], is_periodic=task_params[idx]['periodic'],
+                                     _random=_random)
+                      for idx, _random in zip(task_params, spawn_generators(task_seed, len(task_params)))}
+        net = NETWORKS[network](num_boards=_params.get('num_boards'), num_cpus=_params.get('num_cpus'), _random=None,
+                                _params=_params, seed=network_seed)
+        simulation_class = EventDrivenSimulation if event_driven else Simulation
+        self.simulation = simulation_class(_object=net, delta_time=_params.get('delta_time'))
+        self.lock = asyncio.Lock()
+
+    def apply(self, request):
+        """
+        Execute a request on the simulation (called in the executor, never on the event loop)
+        """
+        op = request['op']
+        if op == 'batch':
+            return [self.apply(sub_request) for sub_request in request['requests']]
+        if op == 'step':
+            if request.get('steps') is not None:
+                self.simulation.run_steps(int(request['steps']))
+            else:
+                self.simulation.running_simulation(float(request['time_interval']))
+            return {'time': self.simulation.clock.sim_time}
+        if op == 'assign':
+            self.simulation.assign_arrays(self.tasks, task_ids=request['task_ids'], task_mask=request.get('mask'))
+            return None
+        if op == 'fault':
+            self.simulation.assign_arrays(statuses=request['statuses'], status_mask=request.get('mask'))
+            return None
+        if op == 'snapshot':
+            snapshot = self.simulation.interact_with_object(is_get_snapshot=True)
+            result = {name: snapshot[name].tolist() for name in snapshot.dtype.names}
+            result['time'] = self.simulation.clock.sim_time
+            return result
+        if op == 'reset':
+            self.simulation.interact_with_object(is_reset=True)
+            return None
+        raise ValueError(f"Unknown operation {op}")
+
+
+class SimulationService:
+    """
+    Host of many independent simulation sessions. The stepping runs in a thread pool, off the event loop,
+    and the requests of different sessions proceed concurrently.
+    """
+
+    def __init__(self, executor=None, max_workers=None):
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=max_workers)
+        self.sessions = dict()
+        self.session_ids = itertools.count()
+        self.servers = list()
+
+    async def handle(self, request):
+        """
+        Serve one request
+        :param request: dictionary, see the module documentation
+        :return: response dictionary
+        """
+        response = {'id': request.get('id'), 'ok': True, 'result': None}
+        try:
+            op = request['op']
+            loop = asyncio.get_running_loop()
+            if op == 'create':
+                session = await loop.run_in_executor(
+                    self.executor, lambda: Session(request['params'], request.get('network', 'vectorized'),
+                                                   request.get('seed'), request.get('event_driven', False)))
+                session_id = next(self.session_ids)
+                self.sessions[session_id] = session
+                response['result'] = session_id
+            elif op == 'close':
+                self.sessions.pop(request['session'])
+            elif op == 'sessions':
+                response['result'] = list(self.sessions)
+            else:
+                session = self.sessions[request['session']]
+                async with session.lock:
+                    response['result'] = await loop.run_in_executor(self.executor, session.apply, request)
+        except Exception as error:
+            response = {'id': request.get('id'), 'ok': False, 'error': f"{type(error).__name__}: {error}"}
+        return response
+
+    async def _respond(self, line, writer):
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            response = {'id': None, 'ok': False, 'error': f"Invalid request: {error}"}
+        else:
+            response = await self.handle(request)
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    async def _handle_connection(self, reader, writer):
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._respond(line, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def start_unix(self, path):
+        server = await asyncio.start_unix_server(self._handle_connection, path=path, limit=LINE_LIMIT)
+        self.servers.append(server)
+        return server
+
+    async def start_tcp(self, host='127.0.0.1', port=0):
+        server = await asyncio.start_server(self._handle_connection, host=host, port=port, limit=LINE_LIMIT)
+        self.servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = list()
+        self.sessions.clear()
+        self.executor.shutdown(wait=False)
+
+
+class LoopbackTransport:
+    """
+    In-process transport: the requests are served directly by the service, with the same JSON encoding
+    of the socket transport
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def send(self, request):
+        response = await self.service.handle(json.loads(json.dumps(request)))
+        return json.loads(json.dumps(response))
+
+    async def close(self):
+        pass
+
+
+class StreamTransport:
+    """
+    Socket transport: the requests are pipelined, the responses are matched to the requests by id
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.request_ids = itertools.count()
+        self.pending = dict()
+        self.receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def open_unix(cls, path):
+        return cls(*await asyncio.open_unix_connection(path, limit=LINE_LIMIT))
+
+    @classmethod
+    async def open_tcp(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port, limit=LINE_LIMIT))
+
+    async def _receive(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.pending.pop(response['id'], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('Connection closed'))
+            self.pending.clear()
+
+    async def send(self, request):
+        request = dict(request, id=next(self.request_ids))
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request['id']] = future
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        await self.receiver
+
+
+class SimulationClient:
+    """
+    Client of a SimulationService, over any transport exposing send(request) -> response
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    @classmethod
+    async def connect_unix(cls, path):
+        return cls(await StreamTransport.open_unix(path))
+
+    @classmethod
+    async def connect_tcp(cls, host, port):
+        return cls(await StreamTransport.open_tcp(host, port))
+
+    @classmethod
+    def loopback(cls, service):
+        return cls(LoopbackTransport(service))
+
+    async def request(self, op, **fields):
+        response = await self.transport.send(dict(fields, op=op))
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    async def create(self, _params, network='vectorized', seed=None, event_driven=False):
+        """
+        :return: id of the new session
+        """
+        return await self.request('create', params=_params, network=network, seed=seed, event_driven=event_driven)
+
+    async def step(self, session, steps=None, time_interval=None):
+        return await self.request('step', session=session, steps=steps, time_interval=time_interval)
+
+    async def assign(self, session, task_ids, mask=None):
+        return await self.request('assign', session=session, task_ids=_to_list(task_ids), mask=_to_list(mask))
+
+    async def fault(self, session, statuses, mask=None):
+        return await self.request('fault', session=session, statuses=_to_list(statuses), mask=_to_list(mask))
+
+    async def snapshot(self, session):
+        """
+        :return: dictionary with 'time' and one (boards x cpus) array per field of the snapshot
+        """
+        result = await self.request('snapshot', session=session)
+        return {name: np.asarray(values) if name != 'time' else values for name, values in result.items()}
+
+    async def batch(self, session, requests):
+        """
+        Execute many requests of the session in one round trip, e.g. [{'op': 'assign', ...}, {'op': 'step', ...}]
+        """
+        return await self.request('batch', session=session, requests=requests)
+
+    async def reset(self, session):
+        return await self.request('reset', session=session)
+
+    async def close_session(self, session):
+        return await self.request('close', session=session)
+
+    async def close(self):
+        await self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+def _to_list(array):
+    return np.asarray(array).tolist() if array is not None else None
+
+
+async def _serve(args):
+    service = SimulationService(max_workers=args.workers)
+    server = await (service.start_unix(args.unix) if args.unix else service.start_tcp(args.host, args.port))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Asyncio service hosting simulation sessions")
+    parser.add_argument("--unix", help="path of the unix socket")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host (without --unix)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (without --unix)")
+    parser.add_argument("--workers", type=int, help="threads running the simulation steps")
+    asyncio.run(_serve(parser.parse_args()))
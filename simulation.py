@@ -1,31 +1,121 @@
-import components
+import functools
+import heapq
+import pickle
+import time
+
+from components import Clock
 
 
 class Simulation:
-    def __init__(self, _object=None, delta_time=1.0):
-        # self.delta_time = delta_time
+    def __init__(self, _object=None, delta_time=1.0, recorder=None, profiler=None):
+        # The clock belongs to the simulation and it is shared with every component of the network
+        self.clock = Clock(delta_time=delta_time)
         self.object = _object
-        components.SIM_TIME = 0.0
-        components.DELTA_TIME = delta_time
+        if self.object is not None:
+            self.object.set_clock(self.clock)
+        # Optional TelemetryRecorder, it stores the state of the network after every step
+        self.recorder = recorder
+        # Optional SimulationProfiler, it accumulates the time spent in every phase of the step
+        self.profiler = profiler
 
     def running_simulation(self, time_interval):
         # CHECK if the time interval is lesser than the delta time
-        time_interval = max(components.DELTA_TIME, time_interval)
+        time_interval = max(self.clock.delta_time, time_interval)
 
         # COMPUTE how many steps to take
-        steps = int(time_interval // components.DELTA_TIME)
+        steps = int(time_interval // self.clock.delta_time)
+        self.run_steps(steps)
+
+    def run_steps(self, steps):
+        # Networks able to run many steps on their own (e.g. in worker processes) get the whole interval at once
+        if hasattr(self.object, 'run_steps') and self.recorder is None:
+            if self.profiler is not None:
+                self._timed('update', self.object.run_steps, steps)
+            else:
+                self.object.run_steps(steps)
+            for _ in range(steps):
+                self.clock.sim_time += self.clock.delta_time
+            self.clock.step += steps
+            return
+
+        update = self._update_function()
         for _ in range(steps):
             # UPDATE the network
-            self.object.update()
+            update()
             # INCREASE the simulation time
-            components.SIM_TIME += components.DELTA_TIME
+            self.clock.sim_time += self.clock.delta_time
+            self.clock.step += 1
+            if self.recorder is not None:
+                self.recorder.record(self.clock.sim_time, self.object)
+
+    def stream(self, every=1, time_interval=None, reducers=()):
+        """
+        Run the simulation as a generator, yielding the state of the network every `every` steps.
+        The reducers (see streaming.py) are fed with the state after every step and reset after every yield,
+        so arbitrarily long runs are consumed in constant memory. Without reducers the steps between two yields
+        are run in bulk.
+        :param every: number of steps between two yields
+        :param time_interval: virtual seconds to simulate (None to stream forever)
+        :param reducers: on-line reducers exposing name, update(snapshot), result() and reset()
+        :return: generator of dictionaries with 'time', 'snapshot' ((boards x cpus) array with SNAPSHOT_DTYPE)
+                 and the result of every reducer, by name
+        """
+        total_steps = None
+        if time_interval is not None:
+            total_steps = int(max(self.clock.delta_time, time_interval) // self.clock.delta_time)
+        for reducer in reducers:
+            reducer.reset()
+
+        snapshot = None
+        done = 0
+        while total_steps is None or done < total_steps:
+            steps = every if total_steps is None else min(every, total_steps - done)
+            if reducers:
+                for _ in range(steps):
+                    self.run_steps(1)
+                    snapshot = self.object.snapshot(out=snapshot)
+                    for reducer in reducers:
+                        reducer.update(snapshot)
+            else:
+                self.run_steps(steps)
+                snapshot = self.object.snapshot(out=snapshot)
+            done += steps
+
+            output = {'time': self.clock.sim_time, 'snapshot': snapshot.copy()}
+            for reducer in reducers:
+                output[reducer.name] = reducer.result()
+                reducer.reset()
+            yield output
+
+    def _update_function(self):
+        # Without profiler the network is updated with the non-instrumented code path
+        if self.profiler is None:
+            return self.object.update
+        if hasattr(self.object, 'update_profiled'):
+            return functools.partial(self.object.update_profiled, self.profiler)
+        return functools.partial(self._timed, 'update', self.object.update)
 
-    def interact_with_object(self, data=None, is_assign_task=False, is_get_data=False, is_reset=False, is_fault=False):
+    def _timed(self, phase, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.profiler.add(phase, None, time.perf_counter() - start)
+        return result
+
+    def interact_with_object(self, data=None, is_assign_task=False, is_get_data=False, is_reset=False, is_fault=False,
+                             is_get_snapshot=False, is_get_changes=False):
+        start = time.perf_counter()
+        result = None
 
         if is_assign_task:
             self.object.interact(data)
         elif is_get_data:
-            return self.object.interact()
+            result = self.object.interact()
+        elif is_get_snapshot:
+            # Structured array (boards x cpus) with task_id, temperature, power, status. No string is formatted
+            result = self.object.snapshot()
+        elif is_get_changes:
+            # Only the cpus changed since the previous poll of the SnapshotCursor given as data
+            result = data.poll(self.object)
         elif is_reset:
             self.object.reset()
         elif is_fault:
@@ -34,3 +124,110 @@ class Simulation:
         #     self.object.interact(data)
         # else:
         #     return self.object.interact()
+
+        if self.profiler is not None:
+            self.profiler.add('interact', None, time.perf_counter() - start)
+        return result
+
+    def assign_arrays(self, tasks=None, task_ids=None, statuses=None, task_mask=None, status_mask=None):
+        """
+        Bulk assignment of tasks and faults from (boards x cpus) arrays, see Network.assign_arrays
+        """
+        start = time.perf_counter()
+        self.object.assign_arrays(tasks, task_ids, statuses, task_mask, status_mask)
+        if self.profiler is not None:
+            self.profiler.add('interact', None, time.perf_counter() - start)
+
+    def checkpoint(self):
+        """
+        Full state of the simulation: clock and network (cpu states, OU values, random streams of cpus and tasks)
+        :return: bytes, to be passed to restore()
+        """
+        return pickle.dumps((self.clock, self.object), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, checkpoint):
+        """
+        Resume the simulation from a state returned by checkpoint()
+        """
+        clock, _object = pickle.loads(checkpoint)
+        if self.object is not None and hasattr(self.object, 'close'):
+            self.object.close()
+        self.clock = clock
+        self.object = _object
+
+    def save_checkpoint(self, path):
+        with open(path, 'wb') as checkpoint_file:
+            checkpoint_file.write(self.checkpoint())
+
+    def load_checkpoint(self, path):
+        with open(path, 'rb') as checkpoint_file:
+            self.restore(checkpoint_file.read())
+
+    def fork(self):
+        """
+        Independent copy of the simulation from the current state, to simulate a what-if branch
+        """
+        simulation = self.__class__(delta_time=self.clock.delta_time)
+        simulation.clock, simulation.object = pickle.loads(self.checkpoint())
+        return simulation
+
+
+class EventDrivenSimulation(Simulation):
+    """
+    Same interface of Simulation, but the network is advanced with a discrete-event scheduler:
+    a priority queue holds, for every cpu, the next step in which something discrete can happen
+    (task completion, status change). Between two events the cpu is advanced in bulk, sampling
+    power and temperature with the exact multi-step transition of the OU process.
+    """
+
+    def run_steps(self, steps):
+        # The scheduler needs the cpu objects, other networks are advanced step by step.
+        # The same is required to record the telemetry, since between the events the cpus aren't synchronized
+        if not hasattr(self.object, 'boards') or self.recorder is not None:
+            return super().run_steps(steps)
+
+        start_time = self.clock.sim_time
+        start_step = self.clock.step
+
+        cpus = [cpu for board in self.object.boards for cpu in board.cpus]
+        board_ids = [board.id for board in self.object.boards for _ in board.cpus]
+        # Step reached by every cpu
+        cpu_steps = [0] * len(cpus)
+        queue = list()
+        for idx, cpu in enumerate(cpus):
+            next_step = cpu.steps_to_next_event()
+            if next_step < steps:
+                queue.append((next_step, idx))
+            else:
+                cpu.advance_quiet(steps)
+        heapq.heapify(queue)
+
+        while queue:
+            step, idx = heapq.heappop(queue)
+            cpu = cpus[idx]
+            self.clock.sim_time = start_time + step * self.clock.delta_time
+            self.clock.step = start_step + step
+
+            # Advance in bulk up to the event, then simulate the event step
+            cpu.advance_quiet(step - cpu_steps[idx])
+            if self.profiler is not None:
+                cpu.update_profiled(self.profiler, board_ids[idx])
+            else:
+                cpu.update()
+            cpu_steps[idx] = step + 1
+
+            # SCHEDULE the next event of the cpu
+            self.clock.sim_time += self.clock.delta_time
+            next_step = cpu_steps[idx] + cpu.steps_to_next_event()
+            if next_step < steps:
+                heapq.heappush(queue, (next_step, idx))
+            else:
+                cpu.advance_quiet(steps - cpu_steps[idx])
+
+        # INCREASE the simulation time
+        self.clock.sim_time = start_time + steps * self.clock.delta_time
+        self.clock.step = start_step + steps
+
+        # The cpus are updated directly, bypassing Network.update: the awake ones are the cpus advanced
+        if getattr(self.object, 'hotspot_index', None) is not None:
+            self.object.hotspot_index.refresh(self.object, self.object.awake_cpus())
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class WindowedStats:
+    """
+    Mean, min and max of a field of every cpu over the steps of the window (the steps between two yields of
+    Simulation.stream), updated incrementally: only the running sums and extremes are kept
+    """
+
+    def __init__(self, field='temperature'):
+        self.field = field
+        self.name = f"{field}_window"
+        self.count = 0
+        self.total = None
+        self.minimum = None
+        self.maximum = None
+
+    def reset(self):
+        self.count = 0
+
+    def update(self, snapshot):
+        values = snapshot[self.field]
+        if self.count == 0:
+            self.total = np.array(values, dtype=float)
+            self.minimum = np.array(values)
+            self.maximum = np.array(values)
+        else:
+            np.add(self.total, values, out=self.total)
+            np.minimum(self.minimum, values, out=self.minimum)
+            np.maximum(self.maximum, values, out=self.maximum)
+        self.count += 1
+
+    def result(self):
+        """
+        :return: dictionary with the (boards x cpus) arrays 'mean', 'min', 'max' and the number of steps 'count'
+        """
+        if self.count == 0:
+            return {'mean': None, 'min': None, 'max': None, 'count': 0}
+        return {'mean': self.total / self.count, 'min': self.minimum.copy(), 'max': self.maximum.copy(),
+                'count': self.count}
+
+
+class BoardPowerSum:
+    """
+    Total power of every board: value at the last step, mean and peak over the window
+    """
+
+    def __init__(self):
+        self.name = 'board_power'
+        self.count = 0
+        self.last = None
+        self.total = None
+        self.peak = None
+
+    def reset(self):
+        self.count = 0
+
+    def update(self, snapshot):
+        self.last = snapshot['power'].sum(axis=1)
+        if self.count == 0:
+            self.total = self.last.copy()
+            self.peak = self.last.copy()
+        else:
+            self.total += self.last
+            np.maximum(self.peak, self.last, out=self.peak)
+        self.count += 1
+
+    def result(self):
+        """
+        :return: dictionary with the (boards,) arrays 'last', 'mean', 'max' and the number of steps 'count'
+        """
+        if self.count == 0:
+            return {'last': None, 'mean': None, 'max': None, 'count': 0}
+        return {'last': self.last, 'mean': self.total / self.count, 'max': self.peak.copy(), 'count': self.count}
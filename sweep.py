@@ -0,0 +1,130 @@
+"""
+Parameter sweeps sharing a warmed-up prefix: the common part of the simulation is run once, then every sweep
+point is branched from its final state and only the suffix of the point is simulated.
+
+    sim.interact_with_object(data, is_assign_task=True)
+    sim.running_simulation(time_interval=30.0)                 # common prefix
+
+    def branch(simulation, point):                              # suffix of a point
+        set_time_change_status(simulation.object, point['time_change_status'])
+        simulation.running_simulation(time_interval=60.0)
+        snapshot = simulation.interact_with_object(is_get_snapshot=True)
+        return {'max_temperature': snapshot['temperature'].max()}
+
+    table = sweep(sim, [{'time_change_status': value} for value in (5., 10., 20.)], branch, seed=0)
+"""
+import multiprocessing
+import multiprocessing.connection
+import os
+import traceback
+
+import numpy as np
+
+# Prefix simulation inherited by the forked branches (copy on write)
+_PREFIX = None
+
+FORK = 'fork'      # every branch is a forked process, the prefix state is shared copy-on-write
+CLONE = 'clone'    # every branch is an in-memory clone of the prefix (Simulation.fork), run in this process
+
+
+def set_time_change_status(network, value):
+    """
+    Override the time_change_status of every cpu of the network
+    """
+    if hasattr(network, 'boards'):
+        for board in network.boards:
+            for cpu in board.cpus:
+                cpu.delta_time_change_status = value
+    else:
+        network.delta_time_change_status[:] = value
+
+
+def _branch(simulation, branch, point, seed_sequence):
+    # Independent random streams for every branch
+    if hasattr(simulation.object, 'reseed'):
+        simulation.object.reseed(seed_sequence)
+    return branch(simulation, point)
+
+
+def _run_forked(connection, branch, point, seed_sequence):
+    try:
+        connection.send((True, _branch(_PREFIX, branch, point, seed_sequence)))
+    except Exception:
+        connection.send((False, traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def _sweep_forked(simulation, points, branch, seed_sequences, num_workers):
+    global _PREFIX
+    context = multiprocessing.get_context(FORK)
+    _PREFIX = simulation
+    results = [None] * len(points)
+    running = dict()
+    try:
+        next_point = 0
+        while next_point < len(points) or running:
+            # START branches up to the number of workers
+            while next_point < len(points) and len(running) < num_workers:
+                parent_connection, child_connection = context.Pipe(duplex=False)
+                process = context.Process(target=_run_forked, args=(child_connection, branch, points[next_point],
+                                                                    seed_sequences[next_point]), daemon=True)
+                process.start()
+                child_connection.close()
+                running[parent_connection] = (next_point, process)
+                next_point += 1
+
+            # COLLECT the branches that are done
+            for connection in multiprocessing.connection.wait(list(running)):
+                idx, process = running.pop(connection)
+                try:
+                    ok, result = connection.recv()
+                except EOFError:
+                    ok, result = False, f"Branch {idx} exited with code {process.exitcode}"
+                connection.close()
+                process.join()
+                if not ok:
+                    raise RuntimeError(f"Sweep point {points[idx]} failed:\n{result}")
+                results[idx] = result
+    finally:
+        for idx, process in running.values():
+            process.terminate()
+        _PREFIX = None
+    return results
+
+
+def sweep(simulation, points, branch, seed=None, num_workers=None, method=None):
+    """
+    Run every sweep point from the current state of the simulation (the common prefix, already simulated)
+    :param simulation: the Simulation after the prefix, it is left untouched
+    :param points: list of dictionaries, the parameters of every sweep point
+    :param branch: function (simulation, point) -> dictionary of results: it applies the point to the branched
+                   simulation and runs the suffix. With FORK it runs in a child process
+    :param seed: the random streams of every branch are spawned from it (network cpus and assigned tasks),
+                 tasks assigned by the branch keep their own streams
+    :param num_workers: number of branches run in parallel (FORK only)
+    :param method: FORK or CLONE, default FORK where available
+    :return: table of results, one row per point: dictionary with the parameters and the results of the point
+    """
+    if method is None:
+        method = FORK if FORK in multiprocessing.get_all_start_methods() else CLONE
+    if method == FORK and hasattr(simulation.object, 'close'):
+        # Worker processes can't be shared by forked branches
+        method = CLONE
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(points))
+
+    if method == FORK:
+        results = _sweep_forked(simulation, points, branch, seed_sequences, num_workers or os.cpu_count() or 1)
+    elif method == CLONE:
+        results = list()
+        for point, seed_sequence in zip(points, seed_sequences):
+            clone = simulation.fork()
+            try:
+                results.append(_branch(clone, branch, point, seed_sequence))
+            finally:
+                if hasattr(clone.object, 'close'):
+                    clone.object.close()
+    else:
+        raise ValueError(f"Unknown method {method}")
+
+    return [dict(point, **result) for point, result in zip(points, results)]
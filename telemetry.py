@@ -0,0 +1,78 @@
+import glob
+import os
+
+import numpy as np
+
+# Columns stored for every cpu at every recorded step
+COLUMNS = {
+    'task_id': np.int32,
+    'temperature': np.float32,
+    'power': np.float32,
+    'status': np.int8
+}
+
+
+class TelemetryRecorder:
+    """
+    Record the state of every cpu at every step in preallocated (steps x boards x cpus) buffers.
+    When the buffers are full they are flushed in a segment file (segment_00000.npz, segment_00001.npz, ...)
+    inside the output directory, one array per column plus the simulation time of every step.
+    """
+
+    def __init__(self, directory, num_boards, num_cpus, chunk_steps=4096):
+        self.directory = directory
+        self.chunk_steps = chunk_steps
+        os.makedirs(directory, exist_ok=True)
+
+        # PREALLOCATED BUFFERS
+        self.time = np.empty(chunk_steps)
+        self.buffers = {column: np.empty((chunk_steps, num_boards, num_cpus), dtype=dtype)
+                        for column, dtype in COLUMNS.items()}
+        self.size = 0
+        self.num_segments = 0
+
+    def record(self, sim_time, network):
+        """
+        Store the current state of the network (any object exposing write_state)
+        """
+        self.time[self.size] = sim_time
+        network.write_state(*(self.buffers[column][self.size] for column in COLUMNS))
+        self.size += 1
+        if self.size == self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        if self.size == 0:
+            return
+        path = os.path.join(self.directory, f"segment_{self.num_segments:05}.npz")
+        np.savez(path, time=self.time[:self.size],
+                 **{column: buffer[:self.size] for column, buffer in self.buffers.items()})
+        self.num_segments += 1
+        self.size = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_telemetry(directory):
+    """
+    Load every segment written by a TelemetryRecorder
+    :param directory: output directory of the recorder
+    :return: dictionary with 'time' (steps) and one (steps x boards x cpus) array per column
+    """
+    arrays = {key: list() for key in ['time', *COLUMNS]}
+    for path in sorted(glob.glob(os.path.join(directory, 'segment_*.npz'))):
+        with np.load(path) as segment:
+            for key, values in arrays.items():
+                values.append(segment[key])
+
+    # No segment flushed yet: empty arrays (the number of boards and cpus is unknown)
+    if not arrays['time']:
+        return {'time': np.empty(0), **{column: np.empty((0, 0, 0), dtype=dtype) for column, dtype in COLUMNS.items()}}
+    return {key: np.concatenate(values) for key, values in arrays.items()}
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from components import Network, Task
+from power_temp_simulation.ornstein_uhlenbeck import OUParameters, stationary_std, transition
+from simulation import EventDrivenSimulation, Simulation
+from vectorized_components import VectorizedNetwork
+
+PARAMS = {"cpu": {"time_change_status": 2.0, "status": 0, "temperature": 45.0, "power": 12.0}}
+LEVEL = OUParameters(delta=1.0, mu=np.array([52.0, 85.0]), sigma=np.array([[0.4, 0.1], [0.1, 0.5]]),
+                     theta=np.array([[0.1, -0.01], [-0.01, 0.1]]))
+
+
+def run_scenario(simulation_class, network_class, seed=2, num_boards=3, num_cpus=20):
+    """
+    Deterministic tasks (no execution time noise), a fault on the first board, then the final snapshot
+    """
+    network = network_class(num_boards, num_cpus, None, PARAMS, seed=seed)
+    simulation = simulation_class(network, 0.5)
+    tasks = [Task(0, 3.0, 0.0, False), Task(1, 7.5, 0.0, True)]
+    simulation.assign_arrays(tasks, task_ids=np.tile(np.arange(num_cpus) % 3 - 1, (num_boards, 1)))
+    simulation.run_steps(37)
+    status_mask = np.zeros((num_boards, num_cpus), dtype=bool)
+    status_mask[0] = True
+    simulation.assign_arrays(statuses=np.full((num_boards, num_cpus), 2), status_mask=status_mask)
+    simulation.run_steps(41)
+    return network.snapshot()
+
+
+# OU TRANSITIONS
+
+def test_transition_matches_repeated_steps():
+    step_matrix = np.eye(2) - LEVEL.theta * LEVEL.delta
+    step_covariance = np.sqrt(LEVEL.delta) * LEVEL.sigma
+    power, covariance = np.eye(2), np.zeros((2, 2))
+    for steps in range(1, 8):
+        covariance = step_matrix @ covariance @ step_matrix.T + step_covariance
+        power = step_matrix @ power
+        transition_power, factor = transition(LEVEL, steps)
+        np.testing.assert_allclose(transition_power, power, atol=1e-12)
+        np.testing.assert_allclose(factor @ factor.T, covariance, atol=1e-9)
+
+
+@pytest.mark.parametrize('steps', [0.5, 0.25, 1.7])
+def test_fractional_transitions_compose(steps):
+    # Two transitions of half the steps are one transition of the steps
+    half_power, half_factor = transition(LEVEL, steps / 2)
+    power, factor = transition(LEVEL, steps)
+    np.testing.assert_allclose(half_power @ half_power, power, atol=1e-12)
+    composed = half_power @ half_factor @ half_factor.T @ half_power.T + half_factor @ half_factor.T
+    np.testing.assert_allclose(composed, factor @ factor.T, atol=1e-9)
+
+
+def test_transition_rejects_negative_steps():
+    with pytest.raises(ValueError):
+        transition(LEVEL, -1)
+
+
+# ENGINES
+
+@pytest.mark.parametrize('simulation_class, network_class', [(EventDrivenSimulation, Network),
+                                                             (Simulation, VectorizedNetwork),
+                                                             (EventDrivenSimulation, VectorizedNetwork)])
+def test_discrete_state_matches_network(simulation_class, network_class):
+    expected = run_scenario(Simulation, Network)
+    snapshot = run_scenario(simulation_class, network_class)
+    np.testing.assert_array_equal(snapshot['task_id'], expected['task_id'])
+    np.testing.assert_array_equal(snapshot['status'], expected['status'])
+
+
+@pytest.mark.parametrize('simulation_class, network_class', [(Simulation, Network),
+                                                             (EventDrivenSimulation, Network),
+                                                             (Simulation, VectorizedNetwork)])
+@pytest.mark.parametrize('is_busy', [False, True])
+def test_stationary_statistics(simulation_class, network_class, is_busy):
+    # Idle cpus stay in the level 0 (most of them parked), busy cpus reach the level 3
+    network = network_class(20, 50, None, PARAMS, seed=4)
+    simulation = simulation_class(network, 0.5)
+    if is_busy:
+        simulation.assign_arrays([Task(0, 1000.0, 0.0, False)], task_ids=np.zeros((20, 50), dtype=int))
+    simulation.run_steps(200)
+    snapshot = network.snapshot()
+    level = network.levels[3 if is_busy else 0]
+    assert np.all(snapshot['status'] == (3 if is_busy else 0))
+    for field, mean, std in zip(('power', 'temperature'), level.mu, stationary_std(level)):
+        values = snapshot[field].ravel()
+        assert abs(values.mean() - mean) < 5 * std / np.sqrt(values.size)
+        assert abs(values.std() / std - 1) < 0.1
+
+
+# DETERMINISM
+
+@pytest.mark.parametrize('network_class', [Network, VectorizedNetwork])
+def test_fork_is_deterministic(network_class):
+    network = network_class(3, 10, None, PARAMS, seed=6)
+    simulation = Simulation(network, 0.5)
+    simulation.assign_arrays([Task(0, 3.0, 0.5, True, _random=np.random.default_rng(1))],
+                             task_ids=np.zeros((3, 10), dtype=int))
+    simulation.run_steps(20)
+    checkpoint = simulation.checkpoint()
+    fork = simulation.fork()
+    simulation.run_steps(30)
+    fork.run_steps(30)
+    np.testing.assert_array_equal(fork.object.snapshot(), simulation.object.snapshot())
+
+    simulation.restore(checkpoint)
+    simulation.run_steps(30)
+    np.testing.assert_array_equal(simulation.object.snapshot(), fork.object.snapshot())
+
+
+@pytest.mark.parametrize('network_class', [Network, VectorizedNetwork])
+def test_parked_cpus_are_read_independent(network_class):
+    def run(read):
+        network = network_class(4, 8, None, PARAMS, seed=3)
+        simulation = Simulation(network, 0.5)
+        task_ids = np.full((4, 8), -1)
+        task_ids[:, ::2] = 0
+        simulation.assign_arrays([Task(0, 3.0, 0.5, False, _random=np.random.default_rng(1))], task_ids=task_ids)
+        rng = np.random.default_rng(7)
+        for _ in range(150):
+            simulation.run_steps(1)
+            if read:
+                network.read_cpus(rng.choice(32, 5, replace=False))
+        return network.snapshot(), network.awake_cpus().size
+
+    (snapshot, awake), (read_snapshot, _) = run(False), run(True)
+    # Some cpus parked, and reading them in between does not change the run
+    assert awake < 32
+    np.testing.assert_array_equal(read_snapshot, snapshot)
+
+
+@pytest.mark.parametrize('network_class', [Network, VectorizedNetwork])
+def test_unknown_status_changes_nothing(network_class):
+    network = network_class(2, 3, None, PARAMS, seed=1)
+    Simulation(network, 0.5).run_steps(5)
+    before = network.snapshot().copy()
+    with pytest.raises(ValueError, match='Unknown level: 7'):
+        network.assign_arrays(statuses=np.full((2, 3), 7))
+    np.testing.assert_array_equal(network.snapshot(), before)
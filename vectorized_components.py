@@ -0,0 +1,484 @@
+import time
+
+import numpy as np
+
+from components import PARK_DEVIATION, SNAPSHOT_DTYPE, Clock, Task, advance_keyed, check_statuses, \
+    derive_noise_key, derived_sequence, get_levels, reseed_tasks, selected_cpus, spawn_generators
+from hotspot import HotspotIndex
+from power_temp_simulation.ornstein_uhlenbeck import BatchedMultivariateOrnsteinUhlenbeck, stationary_std, \
+    transition_coefficients
+
+
+class VectorizedNetwork:
+    """
+    Drop-in replacement for Network that keeps the state of every cpu in contiguous NumPy arrays
+    (structure of arrays) and advances the whole network with one batched step.
+    The object exposes the same update/reset/interact interface used by Simulation.
+    """
+
+    def __init__(self, num_boards, num_cpus, _random, _params=None, clock=None, seed=None):
+        if _random is None and seed is None:
+            raise ValueError('The network needs a random stream (_random) or a seed')
+        self.clock = clock if clock is not None else Clock()
+        self.num_boards = num_boards
+        self.num_cpus = num_cpus
+        # Ids of the boards in the reports, e.g. their global ids when the network is a shard (see ShardedNetwork)
+        self.board_ids = list(range(num_boards))
+        # The batched draws need one stream for the whole network, with a seed it is spawned from it.
+        # The parked cpus are caught up with keyed normals (see advance_keyed), so reading the state does not
+        # change any trajectory. The tasks get streams spawned from the task sequence when they are assigned
+        if seed is not None:
+            _random, noise_random, task_random = spawn_generators(seed, 3)
+            self.noise_key = derive_noise_key(noise_random.bit_generator.seed_seq)
+            self.task_sequence = task_random.bit_generator.seed_seq
+        else:
+            self.noise_key = derive_noise_key(_random)
+            self.task_sequence = derived_sequence(_random)
+        self.random = _random
+        self.default_params = _params.get('cpu') if _params is not None else None
+
+        size = num_boards * num_cpus
+
+        # POWER TEMPERATURE LEVELS (shared by every cpu, indexed by level)
+        self.levels = get_levels(self.default_params)
+
+        # GENERIC PARAMETERS
+        self.delta_time_change_status = np.full(size, 10.)
+
+        # CPU SPECIFIC PARAMETERS
+        self.status = np.zeros(size, dtype=np.int64)
+        self.working_time = np.zeros(size)
+
+        # TASK SPECIFIC PARAMETERS
+        self.is_busy = np.zeros(size, dtype=bool)
+        self.current_task = np.full(size, None, dtype=object)
+        self.task_id = np.full(size, -1, dtype=np.int64)
+        self.is_periodic = np.zeros(size, dtype=bool)
+        self.task_time = np.zeros(size)
+
+        # POWER TEMPERATURE SPECIFIC PARAMETERS (see the temperature and power properties)
+        self._temperature = np.zeros(size)
+        self._power = np.zeros(size)
+
+        # Clock version of the last change of task or status, see SnapshotCursor
+        self.changed_version = np.zeros(size, dtype=np.int64)
+
+        # Clock step up to which the power/temperature of a parked cpu are simulated (-1 if the cpu is awake)
+        self.parked_step = np.full(size, -1, dtype=np.int64)
+
+        # OU GENERATOR (its level is kept apart from status as in PowerTemperatureSimulator)
+        self.power_temp_sim = BatchedMultivariateOrnsteinUhlenbeck(self.levels, size, random=_random)
+        # Bounds of the values of a settled cpu, per level (see PARK_DEVIATION)
+        self.settled_deviation = PARK_DEVIATION * np.array([stationary_std(ou_params) for ou_params in self.levels])
+
+        # Optional HotspotIndex, see enable_hotspot_index
+        self.hotspot_index = None
+
+        self.reset()
+
+    def set_clock(self, clock):
+        self.catch_up()
+        self.clock = clock
+        self.parked_step[self.parked_step >= 0] = clock.step
+
+    def reseed(self, seed):
+        """
+        New random streams spawned from the seed (int or SeedSequence) for the network and for the tasks assigned
+        to the cpus, e.g. to make the branches of a forked simulation independent
+        """
+        # The parked cpus are caught up with the previous key first
+        self.catch_up()
+        network_random, task_random, noise_random = spawn_generators(seed, 3)
+        self.noise_key = derive_noise_key(noise_random.bit_generator.seed_seq)
+        self.task_sequence = task_random.bit_generator.seed_seq
+        self.random = network_random
+        self.power_temp_sim.random = network_random
+        reseed_tasks(self.current_task.tolist(), self.task_sequence)
+
+    def _seed_tasks(self, tasks):
+        # The tasks assigned get new streams spawned from the task sequence of the network, so that a seeded run
+        # does not depend on the streams the tasks were created with
+        reseed_tasks(tasks, self.task_sequence.spawn(1)[0])
+
+    @property
+    def temperature(self):
+        """
+        Temperature of every cpu (flat array), the parked cpus are caught up first
+        """
+        self.catch_up()
+        return self._temperature
+
+    @property
+    def power(self):
+        """
+        Power of every cpu (flat array), the parked cpus are caught up first
+        """
+        self.catch_up()
+        return self._power
+
+    def catch_up(self, idx=slice(None)):
+        """
+        Advance the power/temperature of the parked cpus to the current step of the clock, batched over the cpus
+        (see advance_keyed)
+        :param idx: indexes (or slice) of the cpus to catch up
+        """
+        cpu_idx = np.arange(self.parked_step.size)[idx]
+        parked_step = self.parked_step[cpu_idx]
+        behind = (parked_step >= 0) & (parked_step < self.clock.step)
+        if not behind.any():
+            return
+        cpu_idx = cpu_idx[behind]
+        parked_step = parked_step[behind]
+        coefficients = np.array([transition_coefficients(ou_params, self.clock.delta_time)
+                                 for ou_params in self.levels])
+        value = self.power_temp_sim.value
+        value[cpu_idx, 0], value[cpu_idx, 1] = advance_keyed(
+            self.noise_key, cpu_idx, parked_step, self.clock.step - parked_step,
+            coefficients[self.power_temp_sim.level[cpu_idx]], value[cpu_idx, 0], value[cpu_idx, 1])
+        self._power[cpu_idx] = value[cpu_idx, 0]
+        self._temperature[cpu_idx] = value[cpu_idx, 1]
+        self.parked_step[cpu_idx] = self.clock.step
+
+    def wake(self, idx):
+        """
+        Catch up the parked cpus and update them again at every step
+        """
+        self.catch_up(idx)
+        self.parked_step[idx] = -1
+
+    def reset(self):
+        self.wake(slice(None))
+
+        # GENERIC PARAMETERS
+        self.delta_time_change_status[:] = self.default_params.get('time_change_status')
+
+        # CPU SPECIFIC PARAMETERS
+        self.status[:] = self.default_params.get('status')
+        self.working_time[:] = 0.0
+
+        # TASK SPECIFIC PARAMETERS
+        self.is_busy[:] = False
+        self.current_task[:] = None
+        self.task_id[:] = -1
+        self.is_periodic[:] = False
+        self.task_time[:] = 0.0
+
+        # POWER TEMPERATURE SPECIFIC PARAMETERS
+        self._temperature[:] = self.default_params.get('temperature')
+        self._power[:] = self.default_params.get('power')
+        # The OU processes restart from these values at the level of the status, as the cpus of Network
+        self.power_temp_sim.set_level(slice(None), self.status)
+        self.power_temp_sim.value[:, 0] = self._power
+        self.power_temp_sim.value[:, 1] = self._temperature
+        self.changed_version[:] = self.clock.version
+        self.clock.mark_changed(range(self.changed_version.size))
+        self._refresh_hotspot_index()
+
+    def _mark_changed(self, idx, changed):
+        idx = np.arange(self.changed_version.size)[idx] if isinstance(idx, slice) else np.asarray(idx)
+        idx = np.atleast_1d(idx)[np.atleast_1d(changed)]
+        self.changed_version[idx] = self.clock.version
+        self.clock.mark_changed(idx.tolist())
+
+    def _assign_task(self, idx, task):
+        self._mark_changed(idx, self.task_id[idx] != (task.id if task is not None else -1))
+        self.current_task[idx] = task
+        # if the task is the null task put the cpu in idle
+        if task is None:
+            self.task_id[idx] = -1
+            self.is_periodic[idx] = False
+            self.task_time[idx] = 0
+            return
+        # execute the task
+        self.task_id[idx] = task.id
+        self.is_periodic[idx] = task.is_periodic
+        self.is_busy[idx] = True
+        self.task_time[idx] = task.execute() + self.clock.sim_time
+
+    def _execute_tasks(self, idx):
+        # Execution times drawn in one block per task
+        groups = dict()
+        for cpu_idx, task in zip(idx.tolist(), self.current_task[idx]):
+            groups.setdefault(task, list()).append(cpu_idx)
+        for task, cpu_idx in groups.items():
+            self.task_time[cpu_idx] = task.execute_many(len(cpu_idx)) + self.clock.sim_time
+
+    def _set_status(self, idx, val):
+        check_statuses(val, self.levels)
+        self._mark_changed(idx, self.status[idx] != val)
+        self.status[idx] = val
+        self.power_temp_sim.set_level(idx, val)
+
+    @staticmethod
+    def _global(idx, local):
+        # Network indexes of a selection (mask or positions) of the awake cpus idx
+        return local if isinstance(idx, slice) else idx[local]
+
+    def _awake(self):
+        # Cpus updated in this step: a slice when no cpu is parked, their indexes otherwise
+        awake = np.flatnonzero(self.parked_step < 0)
+        return slice(None) if awake.size == self.parked_step.size else awake
+
+    def _update_status(self, idx=slice(None)):
+        # Dividing the working_time in chunks, each one correspond to the status time interval
+        chunks = self.working_time[idx] / self.delta_time_change_status[idx]
+        int_value = np.minimum(3, chunks.astype(np.int64))
+        status = self.status[idx]
+
+        changing = np.flatnonzero(int_value != status)
+        if changing.size == 0:
+            return
+
+        # Get the decimal part, used as probability
+        prob = chunks[changing] - int_value[changing]
+        # If the status is changing from high value to low, the probability is (1 - prob)
+        decreasing = int_value[changing] < status[changing]
+        prob[decreasing] = 1 - prob[decreasing]
+
+        changed = changing[self.random.random(changing.size) < prob]
+        self._set_status(self._global(idx, changed), int_value[changed])
+
+    def _simulate_params(self, idx=slice(None)):
+        # The processes are advanced by the simulated time of the step (exact for any delta_time)
+        if isinstance(idx, slice):
+            value = self.power_temp_sim.advance_time(self.clock.delta_time)
+        else:
+            value = self.power_temp_sim.advance_time(self.clock.delta_time, idx)[idx]
+        self._power[idx] = value[:, 0]
+        self._temperature[idx] = value[:, 1]
+
+    def _update_tasks(self, idx=slice(None)):
+        has_task = self.task_id[idx] != -1
+
+        # TASK isn't ended yet
+        running = has_task & (self.clock.sim_time < self.task_time[idx])
+        self.working_time[self._global(idx, running)] += self.clock.delta_time
+
+        # Task is ended: periodic tasks are re-assigned, the others free the cpu
+        ended = self._global(idx, np.flatnonzero(has_task & ~running))
+        if ended.size > 0:
+            periodic = self.is_periodic[ended]
+            self._execute_tasks(ended[periodic])
+            finished = ended[~periodic]
+            self.is_busy[finished] = False
+            self._assign_task(finished, None)
+
+        # REDUCE WORKING TIME SINCE
+        idle = self._global(idx, ~has_task)
+        self.working_time[idle] = np.maximum(0.0, self.working_time[idle] - self.clock.delta_time)
+
+    def _park_stable(self, idx):
+        # Stable idle cpus (no task, no working time, status 0) are parked, once settled around the mean of their
+        # level, until they are assigned a task or faulted: their power/temperature are caught up when read
+        stable = (self.task_id[idx] == -1) & (self.working_time[idx] == 0.0) & (self.status[idx] == 0)
+        level = self.power_temp_sim.level[idx]
+        deviation = np.abs(self.power_temp_sim.value[idx] - self.power_temp_sim.mu[level])
+        stable &= np.all(deviation <= self.settled_deviation[level], axis=1)
+        self.parked_step[self._global(idx, stable)] = self.clock.step + 1
+
+    def update(self):
+        idx = self._awake()
+
+        # compute probability to change status
+        self._update_status(idx)
+
+        # Simulate temperature and power consumption
+        self._simulate_params(idx)
+
+        # Update task bookkeeping
+        self._update_tasks(idx)
+
+        self._park_stable(idx)
+        self._refresh_hotspot_index(idx)
+
+    def update_profiled(self, profiler):
+        """
+        Same as update(), the time spent in every phase is accumulated in the profiler (the phases are
+        batched over the whole network, so they are not split per board)
+        """
+        start = time.perf_counter()
+        idx = self._awake()
+        self._update_status(idx)
+        status_end = time.perf_counter()
+        self._simulate_params(idx)
+        params_end = time.perf_counter()
+        self._update_tasks(idx)
+        self._park_stable(idx)
+        task_end = time.perf_counter()
+        self._refresh_hotspot_index(idx)
+
+        profiler.add('status', None, status_end - start)
+        profiler.add('power_temperature', None, params_end - status_end)
+        profiler.add('task', None, task_end - params_end)
+
+    def enable_hotspot_index(self, top_k=50, max_staleness=10):
+        """
+        Maintain a HotspotIndex (top-k hottest cpus, per board power and maximum temperature), refreshed
+        after every update
+        :param max_staleness: number of updates within which every parked cpu is caught up and read by the index
+        :return: the index
+        """
+        self.hotspot_index = HotspotIndex(self.num_boards, self.num_cpus, top_k, max_staleness)
+        self.hotspot_index.refresh(self)
+        return self.hotspot_index
+
+    def _refresh_hotspot_index(self, idx=slice(None)):
+        # idx: indexes (or slice) of the cpus changed
+        if self.hotspot_index is not None:
+            self.hotspot_index.refresh(self, None if isinstance(idx, slice) else idx)
+
+    def _board_slice(self, board_id):
+        return slice(board_id * self.num_cpus, (board_id + 1) * self.num_cpus)
+
+    def assign_data(self, board_id, data, is_fault=False):
+        offset = board_id * self.num_cpus
+        if is_fault:
+            changes = [(offset + idx, _d) for idx, _d in enumerate(data) if _d != -1]
+        else:
+            changes = [(offset + idx, _d) for idx, _d in enumerate(data) if isinstance(_d, Task) or _d is None]
+        if is_fault:
+            # Statuses checked before any change
+            check_statuses([_d for _, _d in changes], self.levels)
+        # The parked cpus to change are woken in one batch
+        self.wake(np.array([idx for idx, _ in changes], dtype=np.int64))
+        for idx, _d in changes:
+            if is_fault:
+                self._set_status(idx, _d)
+            else:
+                self._assign_task(idx, _d)
+
+    def collect_data_from_cpus(self, board_id):
+        board = self._board_slice(board_id)
+        self.catch_up(board)
+        columns = np.empty((self.num_cpus, 4), dtype=object)
+        columns[:, 0] = self.task_id[board].tolist()
+        columns[:, 1] = self._temperature[board].tolist()
+        columns[:, 2] = self._power[board].tolist()
+        columns[:, 3] = self.status[board].tolist()
+        return columns.ravel().tolist()
+
+    def self_report(self, board_id):
+        board = self._board_slice(board_id)
+        self.catch_up(board)
+        string_output = f"Board[{self.board_ids[board_id]:03}]"
+        for cpu_id, (task_id, temperature, power, status, working_time) in enumerate(zip(
+                self.task_id[board].tolist(), self._temperature[board].tolist(), self._power[board].tolist(),
+                self.status[board].tolist(), self.working_time[board].tolist())):
+            string_output += f"\t|"
+            string_output += (f"CPU[{cpu_id:03}] " +
+                              "JID:[" + f"{task_id}".rjust(2) + "] " +
+                              "T:" + f"{temperature:.3f}".rjust(6) + " " +
+                              "W:" + f"{power:.3f}".rjust(6) + " " +
+                              f"S:{status} "
+                              f"{working_time:6}" + "[s]")
+        string_output += "\t||"
+        return string_output
+
+    def write_state(self, task_id, temperature, power, status):
+        """
+        Write the numeric state of the network in the given (boards x cpus) arrays
+        """
+        self.catch_up()
+        shape = (self.num_boards, self.num_cpus)
+        task_id[...] = self.task_id.reshape(shape)
+        temperature[...] = self._temperature.reshape(shape)
+        power[...] = self._power.reshape(shape)
+        status[...] = self.status.reshape(shape)
+
+    def snapshot(self, out=None):
+        """
+        Numeric state of the network, no string is formatted
+        :param out: optional (boards x cpus) array with SNAPSHOT_DTYPE to reuse
+        :return: (boards x cpus) structured array with SNAPSHOT_DTYPE
+        """
+        if out is None:
+            out = np.empty((self.num_boards, self.num_cpus), dtype=SNAPSHOT_DTYPE)
+        self.write_state(out['task_id'], out['temperature'], out['power'], out['status'])
+        return out
+
+    def change_versions(self, out=None):
+        """
+        Clock version of the last change of task or status of every cpu, used by SnapshotCursor
+        :param out: optional (boards x cpus) integer array to reuse
+        :return: (boards x cpus) integer array
+        """
+        if out is None:
+            out = np.empty((self.num_boards, self.num_cpus), dtype=np.int64)
+        out[...] = self.changed_version.reshape(self.num_boards, self.num_cpus)
+        return out
+
+    def awake_cpus(self):
+        """
+        :return: flat indexes of the cpus updated at every step (the ones not parked)
+        """
+        return np.flatnonzero(self.parked_step < 0)
+
+    def read_cpus(self, idx):
+        """
+        Numeric state of some cpus, only the parked ones among them are caught up
+        :param idx: flat indexes of the cpus
+        :return: 1-D structured array with SNAPSHOT_DTYPE, one element per index
+        """
+        self.catch_up(idx)
+        out = np.empty(len(idx), dtype=SNAPSHOT_DTYPE)
+        out['task_id'] = self.task_id[idx]
+        out['temperature'] = self._temperature[idx]
+        out['power'] = self._power[idx]
+        out['status'] = self.status[idx]
+        return out
+
+    def assign_arrays(self, tasks=None, task_ids=None, statuses=None, task_mask=None, status_mask=None):
+        """
+        Bulk assignment of faults and tasks from (boards x cpus) arrays, in one pass, the faults are applied first
+        :param tasks: sequence (or dictionary) of tasks indexed by task id
+        :param task_ids: integer array, id of the task to assign (-1 to put the cpu in idle)
+        :param statuses: integer array, status to set
+        :param task_mask: boolean array, False where the task must not change (None to change every cpu)
+        :param status_mask: boolean array, False where the status must not change (None to change every cpu)
+        """
+        status_idx = task_idx = np.zeros(0, dtype=np.int64)
+        # Statuses and task ids are checked before any change
+        if statuses is not None:
+            statuses = np.asarray(statuses).ravel()
+            status_idx = selected_cpus(status_mask, statuses.shape)
+            check_statuses(statuses[status_idx], self.levels)
+        if task_ids is not None:
+            task_ids = np.asarray(task_ids).ravel()
+            task_idx = selected_cpus(task_mask, task_ids.shape)
+            ids = task_ids[task_idx]
+            assigned = [tasks[task_id] for task_id in np.unique(ids[ids >= 0]).tolist()]
+
+        if statuses is not None:
+            self.wake(status_idx)
+            self._set_status(status_idx, statuses[status_idx])
+
+        if task_ids is not None:
+            self.wake(task_idx)
+            self._seed_tasks(assigned)
+            self._assign_task(task_idx[ids < 0], None)
+            # Execution times drawn in one block per task
+            for task_id, task in zip(np.unique(ids[ids >= 0]).tolist(), assigned):
+                cpu_idx = task_idx[ids == task_id]
+                self._mark_changed(cpu_idx, self.task_id[cpu_idx] != task.id)
+                self.current_task[cpu_idx] = task
+                self.task_id[cpu_idx] = task.id
+                self.is_periodic[cpu_idx] = task.is_periodic
+                self.is_busy[cpu_idx] = True
+                self.task_time[cpu_idx] = task.execute_many(cpu_idx.size) + self.clock.sim_time
+
+    def interact(self, data=None, is_fault=False):
+        if data is not None:
+            if not is_fault:
+                self._seed_tasks([_d for board_data in data.values() if board_data is not None for _d in board_data])
+            for board_id in range(self.num_boards):
+                board_data = data.get(board_id)
+                if board_data is not None:
+                    self.assign_data(board_id, board_data, is_fault)
+
+        else:
+            output_string = list()
+            output_data = list()
+            for board_id in range(self.num_boards):
+                output_string.append(self.self_report(board_id))
+                output_data.append(self.collect_data_from_cpus(board_id))
+            return output_data, output_string